@@ -0,0 +1,414 @@
+"""Benchmarks and traffic replay for the Warnet billing server.
+
+These tools start throwaway servers on temporary databases and free
+ports, so they never touch a venue's warnet.db. Captures come from
+`server.py --record`.
+"""
+import socket
+import threading
+import json
+from datetime import datetime, timedelta
+import os
+import time
+import random
+import tempfile
+import argparse
+import contextlib
+import gzip
+import io
+import multiprocessing
+
+from server import WarnetAdmin
+
+def bench_reservations_command(args):
+    """Load N reservations spread over the seats and time the index operations"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    server = WarnetAdmin(db_path=db_path)
+    server.add_user('bench', 'bench')
+    server.add_balance('bench', 1, 'Gamer')
+    server.add_user('walk-in', 'walk-in')  # Logs in on seats booked by 'bench'
+    server.add_balance('walk-in', 1, 'Gamer')
+    seat_ids = [server.register_seat(f'10.0.{i // 250}.{i % 250}', f'GAMER-{i}', 'Gamer')
+                for i in range(args.seats)]
+
+    # Back-to-back one-hour bookings with a random gap, per seat. The first
+    # ones start within the hour, so some walk-in logins hit the guard.
+    now = datetime.now().replace(second=0, microsecond=0)
+    per_seat = args.count // len(seat_ids)
+    rows = []
+    for seat_id in seat_ids:
+        moment = now + timedelta(minutes=5)
+        for _ in range(per_seat):
+            moment += timedelta(minutes=random.choice((0, 0, 30, 60)))
+            rows.append((seat_id, 'bench', moment, moment + timedelta(hours=1), now))
+            moment += timedelta(hours=1)
+    server.conn.executemany('''
+        INSERT INTO reservations (seat_id, username, start_time, end_time, created)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    server.conn.commit()
+
+    started = time.perf_counter()
+    server.load_reservations()
+    print(f"Indexed {len(rows):,} reservations on {len(seat_ids)} seats "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    horizon = (rows[-1][3] - now).total_seconds()
+    probes = [(random.choice(seat_ids), now + timedelta(seconds=random.uniform(0, horizon)))
+              for _ in range(args.queries)]
+
+    def timed(label, operation, quiet=False):
+        log = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+        started = time.perf_counter()
+        with log:
+            for seat_id, moment in probes:
+                operation(seat_id, moment)
+        elapsed = time.perf_counter() - started
+        print(f"{label}: {len(probes) / elapsed:,.0f}/s ({elapsed / len(probes) * 1e6:.1f} us each)")
+
+    timed("Conflict checks", lambda seat_id, moment: server.reservation_conflict(
+        seat_id, 'walk-in', moment, moment + timedelta(hours=2)))
+    timed("Next free slot", lambda seat_id, moment: server.next_free_slot(
+        seat_id, moment, timedelta(hours=2)))
+    refused = []
+    timed("Login checks", lambda seat_id, moment: refused.append(server.verify_credentials(
+        'walk-in', 'walk-in', 'Gamer', seat_id)['status'] != 'success'), quiet=True)
+    print(f"  {sum(refused):,} of {len(refused):,} logins refused by a booking")
+    server.conn.close()
+
+def bench_recovery_command(args):
+    """Simulate a crash with N open sessions and time the startup reconciliation"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    server = WarnetAdmin(db_path=db_path)
+    pc_types = list(server.pricing)
+    server.bulk_import((line, {'username': f'user{line}', 'password': 'pw', 'hours': '10',
+                               'pc_type': pc_types[line % len(pc_types)]})
+                       for line in range(args.sessions))
+
+    now = datetime.now()
+    server.conn.executemany('''
+        INSERT INTO open_sessions (client_ip, username, pc_type, seat_id, start_time, last_checkpoint)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(f'10.0.{line // 250}.{line % 250}', f'user{line}', pc_types[line % len(pc_types)], None,
+           now - timedelta(minutes=random.randint(5, 300)), now - timedelta(seconds=random.randint(0, 30)))
+          for line in range(args.sessions)])
+    server.conn.commit()
+
+    started = time.perf_counter()
+    recovered = server.recover_sessions()
+    elapsed = time.perf_counter() - started
+    print(f"Reconciled {recovered:,} orphaned sessions in {elapsed:.3f}s "
+          f"({recovered / max(elapsed, 1e-9):,.0f} sessions/s)")
+    server.conn.close()
+
+def login_load(port, seats, duration, results):
+    """Load generator process: each simulated seat logs in and out back to back"""
+    deadline = time.perf_counter() + duration
+    completed = [0] * len(seats)
+    failed = [0] * len(seats)
+
+    def seat_loop(slot, username):
+        hostname = f'BENCH-{username}'
+        while time.perf_counter() < deadline:
+            try:
+                sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+                sock.recv(1024)  # IDENTIFY
+                sock.send(json.dumps({'client_ip': '10.98.0.1', 'hostname': hostname,
+                                      'pc_type': 'Normal'}).encode())
+                sock.send(json.dumps({'command': 'login', 'username': username, 'password': 'bench',
+                                      'pc_type': 'Normal'}).encode())
+                if json.loads(sock.recv(1024)).get('status') == 'success':
+                    completed[slot] += 1
+                    sock.send(json.dumps({'command': 'stop_session'}).encode())
+                    sock.recv(1024)
+                sock.close()
+            except (OSError, ValueError):
+                failed[slot] += 1
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=seat_loop, args=(slot, username))
+               for slot, username in enumerate(seats)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((sum(completed), sum(failed)))
+
+def bench_logins_command(args):
+    """Logins per second through the supervisor for each worker count"""
+    context = multiprocessing.get_context('spawn')
+    print(f"{args.clients} seats from {args.generators} generator processes, "
+          f"{args.duration:.0f}s per run, {os.cpu_count()} CPUs")
+    for workers in [int(count) for count in args.worker_counts.split(',')]:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            server = WarnetAdmin(host='127.0.0.1', port=port, db_path=db_path, workers=workers)
+            server.bulk_import((line, {'username': f'bench{line}', 'password': 'bench',
+                                       'hours': '1000', 'pc_type': 'Normal'})
+                               for line in range(args.clients))
+            server.quiet_workers = True
+            server_thread = threading.Thread(target=server.start)
+            server_thread.daemon = True
+            server_thread.start()
+            if not server.workers_ready.wait(60):
+                raise RuntimeError(f"Workers did not start on port {port}")
+
+            results = context.Queue()
+            seats = [f'bench{line}' for line in range(args.clients)]
+            generators = [context.Process(target=login_load,
+                                          args=(port, seats[index::args.generators], args.duration, results))
+                          for index in range(args.generators)]
+            started = time.perf_counter()
+            for generator in generators:
+                generator.start()
+            counts = [results.get() for _ in generators]
+            logins = sum(count[0] for count in counts)
+            failures = sum(count[1] for count in counts)
+            elapsed = time.perf_counter() - started
+            for generator in generators:
+                generator.join()
+            server.cleanup()
+            server_thread.join(timeout=30)
+        print(f"{workers} workers: {logins:,} logins in {elapsed:.1f}s, {logins / elapsed:,.0f} logins/s, {failures} failed")
+
+def load_capture(path):
+    """Group a recorded capture by connection, each list in time order.
+
+    A capture from a server that crashed ends without the gzip trailer,
+    possibly mid-line; everything up to its last flush is still used.
+    """
+    connections = {}
+    with gzip.open(path, 'rt') as f:
+        try:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn last line
+                if entry['c']:
+                    connections.setdefault(entry['c'], []).append(entry)
+        except EOFError:
+            pass  # Truncated stream
+    return connections
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def replay_capture(path, speed=1.0, verbose=False):
+    """Drive a fresh WarnetAdmin with a recorded capture and measure it.
+
+    Every recorded connection is replayed on its own socket at its
+    recorded offset divided by `speed`. Returns a report dict with
+    per-operation latency percentiles and overall throughput.
+    """
+    connections = load_capture(path)
+    if not connections:
+        raise ValueError(f"No connections recorded in {path}")
+    users = {}
+    for events in connections.values():
+        for event in events:
+            if event['e'] == 'login' and event.get('user'):
+                users[event['user']] = event.get('pc_type') or 'Normal'
+
+    # Pick a free port for the throwaway server
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    log = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with log:
+        server = WarnetAdmin(host='127.0.0.1', port=port,
+                             db_path=os.path.join(tempfile.mkdtemp(), 'replay.db'))
+        server.bulk_import((line, {'username': user, 'password': 'replay', 'hours': '10000',
+                                   'pc_type': pc_type})
+                           for line, (user, pc_type) in enumerate(users.items()))
+        server_thread = threading.Thread(target=server.start)
+        server_thread.daemon = True
+        server_thread.start()
+        time.sleep(0.2)
+
+        latencies = {}
+        lateness = []
+        errors = []
+        stats_lock = threading.Lock()
+        capture_start = min(events[0]['t'] for events in connections.values())
+        replay_start = time.perf_counter()
+
+        def wait_until(offset):
+            target = replay_start + (offset - capture_start) / speed
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                with stats_lock:
+                    lateness.append(-delay)
+
+        def timed(operation, sock, message):
+            started = time.perf_counter()
+            if message is not None:
+                sock.send(json.dumps(message).encode())
+            reply = sock.recv(1024)
+            with stats_lock:
+                latencies.setdefault(operation, []).append(time.perf_counter() - started)
+            if not reply:
+                raise ConnectionError(f"Server closed the connection during {operation}")
+            return reply
+
+        def run_connection(conn_id, events):
+            sock = None
+            try:
+                wait_until(events[0]['t'])
+                started = time.perf_counter()
+                sock = socket.create_connection(('127.0.0.1', port), timeout=30)
+                sock.recv(1024)  # IDENTIFY
+                with stats_lock:
+                    latencies.setdefault('connect', []).append(time.perf_counter() - started)
+
+                identify = next((event for event in events if event['e'] == 'identify'), {})
+                sock.send(json.dumps({
+                    'client_ip': '10.99.0.1',
+                    'hostname': identify.get('seat', f'replay-{conn_id}'),
+                    'pc_type': identify.get('pc_type')
+                }).encode())
+                time.sleep(0.005)  # Keep IDENTIFY and the first request in separate reads
+
+                logged_in = False
+                for event in events:
+                    if event['e'] in ('connect', 'identify'):
+                        continue
+                    wait_until(event['t'])
+                    if event['e'] == 'login':
+                        reply = json.loads(timed('login', sock, {
+                            'command': 'login',
+                            'username': event.get('user'),
+                            'password': 'replay' if event.get('ok') else 'wrong',
+                            'pc_type': event.get('pc_type')
+                        }))
+                        logged_in = logged_in or reply.get('status') == 'success'
+                    elif event['e'] == 'sync':
+                        timed('sync', sock, {'command': 'sync'})
+                    elif event['e'] == 'stop_session':
+                        if logged_in:
+                            timed('stop_session', sock, {'command': 'stop_session'})
+                            break
+                        sock.send(json.dumps({'command': 'stop_session'}).encode())
+                    elif event['e'] == 'disconnect':
+                        break
+            except Exception as e:
+                with stats_lock:
+                    errors.append(f"connection {conn_id}: {e}")
+            finally:
+                if sock:
+                    sock.close()
+
+        workers = []
+        for conn_id, events in sorted(connections.items(), key=lambda item: item[1][0]['t']):
+            wait_until(events[0]['t'])
+            worker = threading.Thread(target=run_connection, args=(conn_id, events))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        wall = time.perf_counter() - replay_start
+        server.cleanup()
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        'capture': path,
+        'speed': speed,
+        'connections': len(connections),
+        'wall_seconds': round(wall, 3),
+        'throughput': round(total / wall, 2) if wall else 0,
+        'late_p95_ms': round(percentile(lateness, 0.95) * 1000, 3) if lateness else 0,
+        'errors': errors,
+        'ops': {operation: {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+            'max_ms': round(max(values) * 1000, 3)
+        } for operation, values in sorted(latencies.items())}
+    }
+
+def replay_command(args):
+    report = replay_capture(args.capture, args.speed, args.verbose)
+    print(f"Replayed {report['connections']} connections at {report['speed']}x "
+          f"in {report['wall_seconds']:.2f}s, {report['throughput']:.1f} ops/s, "
+          f"{len(report['errors'])} errors")
+    for operation, stats in report['ops'].items():
+        print(f"  {operation:<13} n={stats['count']:<6} p50 {stats['p50_ms']:8.2f} ms  "
+              f"p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms")
+    for error in report['errors'][:10]:
+        print(f"  error: {error}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+def replay_compare_command(args):
+    """Print latency and throughput deltas between two replay reports"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    def delta(old, new):
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        return f"{old:10.2f} -> {new:10.2f} ({change})"
+
+    print(f"throughput (ops/s) {delta(baseline['throughput'], candidate['throughput'])}")
+    for operation in sorted(set(baseline['ops']) | set(candidate['ops'])):
+        if operation not in baseline['ops'] or operation not in candidate['ops']:
+            print(f"{operation}: only in one report")
+            continue
+        for percentile_key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            print(f"{operation} {percentile_key:<6} "
+                  f"{delta(baseline['ops'][operation][percentile_key], candidate['ops'][operation][percentile_key])}")
+    print(f"errors {len(baseline['errors'])} -> {len(candidate['errors'])}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Warnet billing server benchmarks and replay")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = commands.add_parser('reservations', help="Benchmark the reservation index")
+    bench_parser.add_argument('--count', type=int, default=100000)
+    bench_parser.add_argument('--seats', type=int, default=50)
+    bench_parser.add_argument('--queries', type=int, default=10000)
+    bench_parser.set_defaults(handler=bench_reservations_command)
+
+    recovery_parser = commands.add_parser('recovery', help="Benchmark crash recovery")
+    recovery_parser.add_argument('--sessions', type=int, default=10000)
+    recovery_parser.set_defaults(handler=bench_recovery_command)
+
+    replay_parser = commands.add_parser('replay', help="Replay a --record capture against a fresh server")
+    replay_parser.add_argument('capture')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help="Time acceleration factor")
+    replay_parser.add_argument('--report', help="Save the latency report as JSON")
+    replay_parser.add_argument('--verbose', action='store_true', help="Show the server's own output")
+    replay_parser.set_defaults(handler=replay_command)
+
+    compare_parser = commands.add_parser('replay-compare', help="Compare two replay reports")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.set_defaults(handler=replay_compare_command)
+
+    logins_parser = commands.add_parser('logins', help="Benchmark logins per second by worker count")
+    logins_parser.add_argument('--worker-counts', default='1,2,4', help="Comma-separated worker counts")
+    logins_parser.add_argument('--clients', type=int, default=64, help="Concurrent simulated seats")
+    logins_parser.add_argument('--generators', type=int, default=2, help="Load generator processes")
+    logins_parser.add_argument('--duration', type=float, default=10, help="Seconds per worker count")
+    logins_parser.set_defaults(handler=bench_logins_command)
+
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.handler(args)
@@ -8,15 +8,35 @@ import threading
 import time
 import os
 import json
+import queue
+import math
 
 class WarnetClient:
+    POLL_INTERVAL_MS = 50  # How often the Tk loop drains I/O results
+    DISCOVERY_PORT = 5001  # Must match WarnetAdmin.DISCOVERY_PORT
+    DISCOVERY_PROBE = b'WARNET_DISCOVER'
+    DISCOVERY_TIMEOUT = 3  # Seconds to wait for a broadcast reply
+    SYNC_INTERVAL = 30  # Seconds between countdown syncs with the server
+    TIMED_COMMANDS = ('connect', 'connect_auto', 'login')  # Latency printed by poll_events
+    clock = staticmethod(time.monotonic)  # Countdown time source (faked in tests)
+
     def __init__(self, server_host='localhost', server_port=5000):
+        self.started_at = time.perf_counter()
         self.server_host = server_host
         self.server_port = server_port
         self.socket = None
         self.running = False
         self.last_server_ip = None  # Store last successful connection
         self.pc_type = None  # Add PC type
+        self.settings_shown = False
+        self.window_alive = False
+
+        # Network I/O runs on its own thread; results come back through events
+        self.commands = queue.Queue()
+        self.events = queue.Queue()
+        self.io_thread = threading.Thread(target=self.io_worker)
+        self.io_thread.daemon = True
+        self.io_thread.start()
         
         # Config file path in Documents folder
         self.config_path = os.path.join(os.path.expanduser('~'), 'Documents', 'warnet_config.json')
@@ -48,66 +68,174 @@ class WarnetClient:
         except Exception as e:
             print(f"Error saving config: {e}")
             
-    def connect_to_server(self):
+    def open_connection(self, host, port=None):
+        """Open a socket to the server and answer its IDENTIFY request.
+
+        Runs off the Tk thread only; raises on failure instead of showing dialogs.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(5)  # 5 second timeout
         try:
-            # Create new socket if needed
-            if self.socket:
-                try:
-                    self.socket.close()
-                except:
-                    pass
-                self.socket = None
-                
-            # Create and configure socket
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(5)  # 5 second timeout
-            
-            # Try to connect
-            self.socket.connect((self.server_host, self.server_port))
-            
+            sock.connect((host, port or self.server_port))
+
             # Wait for server identification request
-            server_request = self.socket.recv(1024).decode()
-            if server_request == "IDENTIFY":
-                # Get client network info
-                hostname = socket.gethostname()
-                try:
-                    # Try to get real IP
-                    client_ip = [ip for ip in socket.gethostbyname_ex(hostname)[2] 
-                            if not ip.startswith('127.')][0]
-                except:
-                    # Fallback to basic hostname lookup
-                    client_ip = socket.gethostbyname(hostname)
-                
-                # Send client info
-                client_info = {
-                    'client_ip': client_ip,
-                    'hostname': hostname
-                }
-                self.socket.send(json.dumps(client_info).encode())
-                
-                # Store successful connection IP
-                self.last_server_ip = self.server_host
-                return True
-            else:
+            server_request = sock.recv(1024).decode()
+            if server_request != "IDENTIFY":
                 raise ConnectionError("Invalid server response")
-                
-        except socket.timeout:
-            messagebox.showerror("Connection Error", 
-                            "Connection timed out. Please check server address.")
-            return False
-        except ConnectionRefusedError:
-            messagebox.showerror("Connection Error",
-                            "Connection refused. Please check if server is running.")
-            return False
-        except Exception as e:
-            messagebox.showerror("Connection Error", 
-                            f"Cannot connect to server: {e}\nPlease check if server is running.")
-            return False
+
+            # Get client network info
+            hostname = socket.gethostname()
+            try:
+                # Try to get real IP
+                client_ip = [ip for ip in socket.gethostbyname_ex(hostname)[2]
+                        if not ip.startswith('127.')][0]
+            except:
+                # Fallback to basic hostname lookup
+                client_ip = socket.gethostbyname(hostname)
+
+            # Send client info
+            client_info = {
+                'client_ip': client_ip,
+                'hostname': hostname,
+                'pc_type': self.pc_type  # Lets the server file the seat under its type
+            }
+            sock.send(json.dumps(client_info).encode())
+            return sock
+        except:
+            sock.close()
+            raise
+
+    def discover_server(self):
+        """Broadcast a discovery probe and return (server_ip, port) of the first reply"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.settimeout(0.5)
+        deadline = time.monotonic() + self.DISCOVERY_TIMEOUT
+        try:
+            while time.monotonic() < deadline:
+                # Re-send every half second in case a datagram was dropped
+                sock.sendto(self.DISCOVERY_PROBE, ('<broadcast>', self.DISCOVERY_PORT))
+                try:
+                    data, address = sock.recvfrom(1024)
+                except socket.timeout:
+                    continue
+                try:
+                    reply = json.loads(data.decode())
+                except ValueError:
+                    continue
+                # The reply's source address is always reachable from here,
+                # even if the server reports a different interface
+                return address[0], reply.get('port', self.server_port)
+            raise ConnectionError("No server answered the discovery probe")
         finally:
-            if not self.socket:
-                self.last_server_ip = None
-    
+            sock.close()
+
+    def connect_to_server(self):
+        """Ask the I/O thread to (re)connect to self.server_host"""
+        self.set_status(f"Connecting to {self.server_host}...")
+        self.submit('connect', self.server_host)
+
     def disconnect_from_server(self):
+        self.submit('disconnect')
+
+    def submit(self, command, *args):
+        """Queue a network operation for the I/O thread"""
+        self.commands.put((command, args, time.perf_counter()))
+
+    def io_worker(self):
+        """Run queued network operations off the Tk thread.
+
+        Every result is posted back to self.events and handled by poll_events
+        on the Tk thread, so no socket call can freeze the window.
+        """
+        while True:
+            command, args, queued_at = self.commands.get()
+            if command == 'quit':
+                # Close here: the Tk thread must not touch a socket in use
+                self.io_disconnect()
+                break
+            handler = getattr(self, f'io_{command}')
+            try:
+                result = handler(*args)
+                self.events.put((command, True, result, queued_at))
+            except Exception as e:
+                self.events.put((command, False, e, queued_at))
+
+    def io_connect(self, host):
+        self.io_disconnect()
+        try:
+            self.socket = self.open_connection(host)
+        except:
+            self.last_server_ip = None
+            raise
+        # Store successful connection IP
+        self.last_server_ip = host
+        return host
+
+    def io_connect_auto(self, cached_host):
+        """Race the cached server IP against a discovery broadcast.
+
+        Whichever produces a connected socket first wins; the other attempt
+        is closed as soon as it finishes.
+        """
+        self.io_disconnect()
+        lock = threading.Lock()
+        done = threading.Event()
+        winner = []
+        errors = []
+        pending = [2]
+
+        def finish(host, port, sock, error):
+            with lock:
+                pending[0] -= 1
+                if sock and not winner:
+                    winner.append((host, port, sock))
+                    done.set()
+                    return
+                if error:
+                    errors.append(error)
+                if pending[0] == 0:
+                    done.set()
+            if sock:
+                sock.close()
+
+        def try_cached():
+            if not cached_host:
+                return finish(None, None, None, None)
+            try:
+                finish(cached_host, None, self.open_connection(cached_host), None)
+            except Exception as e:
+                finish(None, None, None, e)
+
+        def try_discovery():
+            try:
+                host, port = self.discover_server()
+                if host == cached_host and port == self.server_port:
+                    # Same server; the cached attempt is already connecting
+                    return finish(None, None, None, None)
+                finish(host, port, self.open_connection(host, port), None)
+            except Exception as e:
+                finish(None, None, None, e)
+
+        for target in (try_cached, try_discovery):
+            attempt = threading.Thread(target=target)
+            attempt.daemon = True
+            attempt.start()
+        done.wait()
+
+        if not winner:
+            self.last_server_ip = None
+            raise errors[0] if errors else ConnectionError("Server not found")
+        host, port, self.socket = winner[0]
+        if port:
+            self.server_port = port
+        self.last_server_ip = host
+        return host
+
+    def io_discover(self):
+        return self.discover_server()[0]
+
+    def io_disconnect(self):
         if self.socket:
             try:
                 self.socket.close()
@@ -115,6 +243,89 @@ class WarnetClient:
                 pass
             self.socket = None
 
+    def io_login(self, credentials):
+        # Try to connect if not connected
+        if not self.socket and self.last_server_ip:
+            self.io_connect(self.last_server_ip)
+
+        if not self.socket:
+            raise ConnectionError("Not connected to server")
+
+        try:
+            self.socket.send(json.dumps(credentials).encode())
+            return json.loads(self.socket.recv(1024).decode())
+        except:
+            self.io_disconnect()
+            raise
+
+    def io_sync(self):
+        if not self.socket:
+            raise ConnectionError("Not connected to server")
+        self.socket.send(json.dumps({'command': 'sync'}).encode())
+        response = json.loads(self.socket.recv(1024).decode())
+        # Stamp the reply on arrival so Tk queueing delay is not counted
+        return response, self.clock()
+
+    def io_stop(self, stop_data):
+        try:
+            if self.socket:
+                self.socket.send(json.dumps(stop_data).encode())
+        finally:
+            self.io_disconnect()
+
+    def poll_events(self):
+        """Dispatch finished I/O operations to their on_* handlers"""
+        try:
+            while True:
+                command, ok, result, queued_at = self.events.get_nowait()
+                if command in self.TIMED_COMMANDS:
+                    elapsed = time.perf_counter() - queued_at
+                    print(f"{command} finished in {elapsed:.3f}s")
+                handler = getattr(self, f'on_{command}', None)
+                if handler:
+                    handler(ok, result)
+        except queue.Empty:
+            pass
+        if self.window_alive:
+            self.window.after(self.POLL_INTERVAL_MS, self.poll_events)
+
+    def set_status(self, text):
+        self.status_label.config(text=text)
+
+    def on_connect(self, ok, result):
+        self.set_status("")
+        if ok:
+            self.server_host = result
+            self.save_config()  # Save successful IP
+            self.settings_frame.pack_forget()
+            self.login_frame.pack()
+            return
+
+        if isinstance(result, socket.timeout):
+            messagebox.showerror("Connection Error",
+                            "Connection timed out. Please check server address.")
+        elif isinstance(result, ConnectionRefusedError):
+            messagebox.showerror("Connection Error",
+                            "Connection refused. Please check if server is running.")
+        else:
+            messagebox.showerror("Connection Error",
+                            f"Cannot connect to server: {result}\nPlease check if server is running.")
+        if not self.settings_shown:
+            self.show_ip_input()
+
+    def on_connect_auto(self, ok, result):
+        self.on_connect(ok, result)
+
+    def on_discover(self, ok, result):
+        # Pre-fill the setup screen unless the user already typed something
+        if ok and self.settings_shown and self.server_ip.get() in ('', 'localhost'):
+            self.server_ip.delete(0, tk.END)
+            self.server_ip.insert(0, result)
+
+    def report_time_to_interactive(self):
+        elapsed = time.perf_counter() - self.started_at
+        print(f"Time to interactive: {elapsed:.3f}s")
+
     def setup_gui(self):
         self.window = tk.Tk()
         self.window.title('Warnet Client')
@@ -134,18 +345,29 @@ class WarnetClient:
         self.password_entry = tk.Entry(self.login_frame, show="*")
         self.password_entry.pack()
         
-        tk.Button(self.login_frame, text="Login", command=self.login).pack(pady=10)
+        self.login_button = tk.Button(self.login_frame, text="Login", command=self.login)
+        self.login_button.pack(pady=10)
+
+        # Progress feedback for background network operations
+        self.status_label = tk.Label(self.window, text="", fg='gray')
+        self.status_label.pack(side='bottom')
+
+        self.window_alive = True
+        self.window.after(self.POLL_INTERVAL_MS, self.poll_events)
+        self.window.after_idle(self.report_time_to_interactive)
 
         # Show appropriate frame based on config
-        if self.last_server_ip:
-            if self.connect_to_server():
-                self.login_frame.pack()
-            else:
-                self.show_ip_input()
+        if self.pc_type:
+            # Cached IP and discovery probe race each other
+            self.set_status("Looking for server...")
+            self.submit('connect_auto', self.last_server_ip)
         else:
+            # First run still needs a PC type; discovery only fills in the IP
             self.show_ip_input()
+            self.submit('discover')
 
     def show_ip_input(self):
+        self.settings_shown = True
         tk.Label(self.settings_frame, text="Server IP:").pack()
         self.server_ip = tk.Entry(self.settings_frame)
         self.server_ip.insert(0, self.server_host)
@@ -166,32 +388,31 @@ class WarnetClient:
     def connect_and_show_login(self):
         self.server_host = self.server_ip.get()
         self.pc_type = self.pc_type_combo.get()
-        if self.connect_to_server():
-            self.save_config()  # Save successful IP
-            self.settings_frame.pack_forget()
-            self.login_frame.pack()
+        self.connect_to_server()
 
     def login(self):
-        # Try to connect if not connected
-        if not self.socket and self.last_server_ip:
-            self.server_host = self.last_server_ip
-            if not self.connect_to_server():
-                return
-
-        if not self.socket:
+        if not self.socket and not self.last_server_ip:
             messagebox.showerror("Error", "Not connected to server")
             return
 
+        credentials = {
+            'command': 'login',
+            'username': self.username_entry.get(),
+            'password': self.password_entry.get(),
+            'pc_type': self.pc_type  # Add PC type to login request
+        }
+        self.login_button.config(state='disabled')
+        self.set_status("Logging in...")
+        self.submit('login', credentials)
+
+    def on_login(self, ok, response):
+        self.login_button.config(state='normal')
+        self.set_status("")
+        if not ok:
+            messagebox.showerror("Error", f"Login failed: {str(response)}")
+            return
+
         try:
-            credentials = {
-                'command': 'login',
-                'username': self.username_entry.get(),
-                'password': self.password_entry.get(),
-                'pc_type': self.pc_type  # Add PC type to login request
-            }
-            self.socket.send(json.dumps(credentials).encode())
-            response = json.loads(self.socket.recv(1024).decode())
-            
             if response['status'] == 'success':
                 self.running = True
                 self.remaining_time = response['balance']
@@ -228,47 +449,63 @@ class WarnetClient:
         
         self.timer_frame.pack()
         
-        # Convert hours to seconds for more precise counting
+        self.start_countdown()
+
+    def start_countdown(self):
+        # Count down against a monotonic deadline so late Tk callbacks
+        # cannot make the display drift from what the server bills
+        now = self.clock()
         self.remaining_seconds = int(self.remaining_time * 3600)
-        
-        def update_timer():
-            if self.running and self.remaining_seconds > 0:
+        self.deadline = now + self.remaining_seconds
+        self.next_sync = now + self.SYNC_INTERVAL
+        self.displayed_seconds = None
+        self.update_timer()
+
+    def update_timer(self):
+        now = self.clock()
+        remaining = self.deadline - now
+        self.remaining_seconds = max(0, math.ceil(remaining))
+
+        if self.running and self.remaining_seconds > 0:
+            # Redraw only when the displayed second changes
+            if self.remaining_seconds != self.displayed_seconds:
                 hours = self.remaining_seconds // 3600
                 minutes = (self.remaining_seconds % 3600) // 60
                 seconds = self.remaining_seconds % 60
                 
                 time_string = f'{hours:02d}:{minutes:02d}:{seconds:02d}'
                 self.timer_label.config(text=time_string)
-                
-                self.remaining_seconds -= 1
-                self.window.after(1000, update_timer)
-            elif self.remaining_seconds <= 0:
-                # Send stop session and reset GUI
-                try:
-                    stop_data = {
-                        'command': 'stop_session',
-                        'username': self.username_entry.get(),
-                        'remaining_seconds': 0
-                    }
-                    self.socket.send(json.dumps(stop_data).encode())
-                except:
-                    pass
-                
-                # Reset GUI
-                self.running = False
-                self.window.overrideredirect(False)
-                self.window.geometry('300x200')
-                self.timer_frame.pack_forget()
-                self.login_frame.pack()
-                self.username_entry.delete(0, tk.END)
-                self.password_entry.delete(0, tk.END)
-                
-                # Disconnect from server
-                self.disconnect_from_server()
-                messagebox.showinfo("Time's Up", "Your session has ended")
-                self.lock_computer()
+                self.displayed_seconds = self.remaining_seconds
 
-        update_timer()
+            if now >= self.next_sync:
+                self.next_sync = now + self.SYNC_INTERVAL
+                self.submit('sync')
+            
+            # Wake up just after the next second boundary
+            delay = (remaining - (self.remaining_seconds - 1)) * 1000
+            self.window.after(max(1, min(1000, int(delay) + 1)), self.update_timer)
+        elif self.running and self.remaining_seconds <= 0:
+            self.session_expired()
+
+    def session_expired(self):
+        # Send stop session (and disconnect) in the background, reset GUI
+        stop_data = {
+            'command': 'stop_session',
+            'username': self.username_entry.get(),
+            'remaining_seconds': 0
+        }
+        self.submit('stop', stop_data)
+        
+        # Reset GUI
+        self.running = False
+        self.window.overrideredirect(False)
+        self.window.geometry('300x200')
+        self.timer_frame.pack_forget()
+        self.login_frame.pack()
+        self.username_entry.delete(0, tk.END)
+        self.password_entry.delete(0, tk.END)
+        messagebox.showinfo("Time's Up", "Your session has ended")
+        self.lock_computer()
 
     def stop_session(self):
         if messagebox.askyesno("Stop Session", "Are you sure you want to end your session?"):
@@ -279,15 +516,13 @@ class WarnetClient:
                     'username': self.username_entry.get(),
                     'remaining_seconds': self.remaining_seconds
                 }
-                self.socket.send(json.dumps(stop_data).encode())
+                self.set_status("Ending session...")
+                self.submit('stop', stop_data)
                 
                 # Restore title bar before closing
                 self.window.overrideredirect(False)
                 self.window.geometry('300x200')  # Reset window size
                 
-                # Disconnect from server
-                self.disconnect_from_server()
-                
                 # Reset client state
                 self.running = False
                 self.timer_frame.pack_forget()
@@ -302,10 +537,28 @@ class WarnetClient:
         messagebox.showwarning("Time's Up", "Your session has ended!")
         ctypes.windll.user32.LockWorkStation()
 
+    def on_sync(self, ok, result):
+        if not ok:
+            print(f"Timer sync failed: {result}")
+            return
+        response, received_at = result
+        if not self.running or response.get('status') != 'success':
+            return
+        # Server balance is authoritative; ignore sub-second rounding noise
+        deadline = received_at + response['remaining_seconds']
+        if abs(deadline - self.deadline) > 1:
+            print(f"Timer corrected by {deadline - self.deadline:+.1f}s")
+            self.deadline = deadline
+
+    def on_stop(self, ok, result):
+        self.set_status("")
+        if not ok:
+            print(f"Error stopping session: {result}")
+
     def on_closing(self):
         self.running = False
-        if self.socket:
-            self.socket.close()
+        self.window_alive = False
+        self.submit('quit')  # The I/O thread closes the socket
         self.window.destroy()
 
     def run(self):
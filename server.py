@@ -4,11 +4,307 @@ import json
 import sqlite3
 from datetime import datetime, timedelta
 import sys
+import os
 import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 import random
 import string
+import csv
+import argparse
+import bisect
+import collections
+import gzip
+import hashlib
+import hmac
+import ipaddress
+import itertools
+import math
+import multiprocessing
+import queue
+import signal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+class RateTable:
+    """Hourly rate for every minute of the week for one PC type, with prefix sums.
+
+    Sessions are priced in O(1) no matter how many tariff boundaries they
+    cross, and the time a balance will last is found in O(log n) by
+    bisecting the prefix sums.
+    """
+    MINUTES_PER_DAY = 24 * 60
+    MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+    SECONDS_PER_WEEK = MINUTES_PER_WEEK * 60
+
+    def __init__(self, base_rate, windows=()):
+        """windows: (days, start_minute, end_minute, rate) in increasing precedence"""
+        self.base_rate = base_rate
+        rates = [base_rate] * self.MINUTES_PER_WEEK
+        for days, start, end, rate in windows:
+            # end <= start wraps past midnight into the next day
+            length = (end - start) % self.MINUTES_PER_DAY or self.MINUTES_PER_DAY
+            for day in days:
+                begin = day * self.MINUTES_PER_DAY + start
+                stop = begin + length
+                if stop <= self.MINUTES_PER_WEEK:
+                    rates[begin:stop] = [rate] * length
+                else:
+                    rates[begin:] = [rate] * (self.MINUTES_PER_WEEK - begin)
+                    rates[:stop - self.MINUTES_PER_WEEK] = [rate] * (stop - self.MINUTES_PER_WEEK)
+        self.rates = rates
+
+        # prefix[m] = sum of hourly rates of minutes before m
+        self.prefix = [0] * (self.MINUTES_PER_WEEK + 1)
+        total = 0
+        for minute, rate in enumerate(rates):
+            total += rate
+            self.prefix[minute + 1] = total
+
+    @staticmethod
+    def to_seconds(moment):
+        """Seconds since a Monday midnight (date.toordinal() day 1 is a Monday)"""
+        return ((moment.toordinal() - 1) * 86400 + moment.hour * 3600 + moment.minute * 60
+                + moment.second + moment.microsecond / 1e6)
+
+    def _cumulative(self, seconds):
+        """Cost in rate-seconds (Rp/hour * seconds) from the epoch up to `seconds`"""
+        weeks, offset = divmod(seconds, self.SECONDS_PER_WEEK)
+        minute = int(offset // 60)
+        return (weeks * self.prefix[-1] * 60 + self.prefix[minute] * 60
+                + self.rates[minute] * (offset - minute * 60))
+
+    def cost(self, start, end):
+        """Price in Rp of using a PC from `start` to `end` (datetimes)"""
+        if end <= start:
+            return 0
+        return (self._cumulative(self.to_seconds(end))
+                - self._cumulative(self.to_seconds(start))) / 3600
+
+    def seconds_affordable(self, start, budget):
+        """How many seconds `budget` Rp lasts when starting at `start`"""
+        if budget <= 0:
+            return 0
+        week_cost = self.prefix[-1] * 60
+        if not week_cost:
+            return float('inf')
+        begin = self.to_seconds(start)
+        target = self._cumulative(begin) + budget * 3600
+        weeks, remainder = divmod(target, week_cost)
+        # Last minute whose starting cumulative cost is still within budget
+        minute = bisect.bisect_right(self.prefix, remainder / 60) - 1
+        offset = (remainder - self.prefix[minute] * 60) / self.rates[minute]
+        return weeks * self.SECONDS_PER_WEEK + minute * 60 + offset - begin
+
+
+class IntervalIndex:
+    """Non-overlapping [start, end) intervals for one seat, sorted by start.
+
+    Because bookings never overlap, the ends are sorted too, so conflict
+    checks are bisects. Next-free-slot lookups use a sparse table of the
+    gaps between bookings, rebuilt lazily after changes, so they stay
+    O(log n) even across long runs of back-to-back bookings.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.gap_table = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def overlapping(self, start, end):
+        """Ids of intervals that overlap [start, end)"""
+        first = bisect.bisect_right(self.ends, start)
+        last = bisect.bisect_left(self.starts, end)
+        return self.ids[first:last]
+
+    def ending_after(self, moment):
+        """Ids of intervals that end after moment, earliest first"""
+        for position in range(bisect.bisect_right(self.ends, moment), len(self.ids)):
+            yield self.ids[position]
+
+    def add(self, start, end, interval_id):
+        if end <= start:
+            raise ValueError("End must be after start")
+        if self.overlapping(start, end):
+            raise ValueError("Interval overlaps an existing one")
+        position = bisect.bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, interval_id)
+        self.gap_table = None
+
+    def remove(self, start, interval_id):
+        position = bisect.bisect_left(self.starts, start)
+        if position < len(self.ids) and self.ids[position] == interval_id:
+            del self.starts[position], self.ends[position], self.ids[position]
+            self.gap_table = None
+            return True
+        return False
+
+    def build_gap_table(self):
+        """gap_table[k][i] = longest free gap after any of bookings i .. i + 2**k - 1"""
+        gaps = [self.starts[i + 1] - self.ends[i] for i in range(len(self.ids) - 1)]
+        gaps.append(float('inf'))  # Everything after the last booking is free
+        table = [gaps]
+        width = 1
+        while width * 2 <= len(gaps):
+            previous = table[-1]
+            table.append([max(previous[i], previous[i + width])
+                          for i in range(len(gaps) - width * 2 + 1)])
+            width *= 2
+        self.gap_table = table
+
+    def next_free(self, after, duration):
+        """Earliest start >= after with `duration` free"""
+        position = bisect.bisect_right(self.ends, after)
+        if position == len(self.ids) or self.starts[position] - after >= duration:
+            return after
+        if self.gap_table is None:
+            self.build_gap_table()
+
+        # Jump over blocks of bookings whose gaps are all too short
+        for level in range(len(self.gap_table) - 1, -1, -1):
+            row = self.gap_table[level]
+            if position < len(row) and row[position] < duration:
+                position += 1 << level
+        return self.ends[position]
+
+
+class ProtocolRecorder:
+    """Append anonymized, timestamped protocol events to a gzipped NDJSON log.
+
+    Usernames and seats are replaced by salted hashes and passwords are
+    never written, so a captured night can be shared and replayed.
+    Each run gets its own file, and the stream is sync-flushed every
+    FLUSH_LINES events or FLUSH_INTERVAL seconds, so a server that dies
+    without cleanup() still leaves a readable capture.
+    """
+    FLUSH_LINES = 1000
+    FLUSH_INTERVAL = 1.0  # Seconds
+
+    def __init__(self, path, salt=None):
+        self.path = path
+        self.salt = salt or os.urandom(8).hex()
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, 'xt', compresslevel=6)  # Never mix two runs in one capture
+        self.pending = 0
+        self.record(0, 'start', wall=datetime.now().isoformat(timespec='seconds'))
+        flush_thread = threading.Thread(target=self.flush_loop)
+        flush_thread.daemon = True
+        flush_thread.start()
+
+    def anonymize(self, value):
+        if value is None:
+            return None
+        return hashlib.sha256(f"{self.salt}:{value}".encode()).hexdigest()[:12]
+
+    def record(self, conn_id, event, **fields):
+        entry = {'t': round(time.monotonic() - self.started, 4), 'c': conn_id, 'e': event}
+        entry.update((key, value) for key, value in fields.items() if value is not None)
+        line = json.dumps(entry, separators=(',', ':'))
+        with self.lock:
+            if self.file:
+                self.file.write(line + '\n')
+                self.pending += 1
+                if self.pending >= self.FLUSH_LINES:
+                    self.flush()
+
+    def flush(self):
+        """Push buffered events to disk as a complete deflate block (lock held)"""
+        self.file.flush()
+        self.pending = 0
+
+    def flush_loop(self):
+        while self.file:
+            time.sleep(self.FLUSH_INTERVAL)
+            with self.lock:
+                if self.file and self.pending:
+                    self.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+class Subscription:
+    """One subscriber's bounded queue of events, taken in batches with drain()"""
+
+    def __init__(self, kinds, maxsize):
+        self.kinds = set(kinds) if kinds else None
+        self.events = collections.deque(maxlen=maxsize)
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def put(self, event):
+        if self.kinds and event['kind'] not in self.kinds:
+            return
+        with self.lock:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1  # The deque discards the oldest one
+            self.events.append(event)
+
+    def drain(self):
+        """(events, dropped): everything pending, and how many were lost since the last drain"""
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class EventBus:
+    """In-process publish/subscribe for server events.
+
+    Events are dicts with a 'kind' (client_connected, client_left,
+    session_started, session_settled, balance_changed, seat_changed) and
+    a 'time'. Each subscriber gets its own bounded queue, so a slow
+    consumer never blocks the connection threads: once full, its oldest
+    events are dropped and counted, and it should resync from a snapshot.
+    Listeners are called synchronously instead, for cheap relays.
+    """
+    QUEUE_SIZE = 10000
+
+    def __init__(self):
+        self.subscriptions = []
+        self.listeners = []
+
+    @property
+    def active(self):
+        return bool(self.subscriptions or self.listeners)
+
+    def subscribe(self, kinds=None, maxsize=None):
+        subscription = Subscription(kinds, maxsize or self.QUEUE_SIZE)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def publish(self, kind, **data):
+        data['kind'] = kind
+        data.setdefault('time', time.time())
+        self.publish_event(data)
+
+    def publish_event(self, event):
+        for subscription in list(self.subscriptions):
+            subscription.put(event)
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Event listener error: {e}")
+
 
 class WarnetAdmin:
     PC_CATEGORIES = {
@@ -16,14 +312,79 @@ class WarnetAdmin:
         'VIP': {'rate': 5000, 'minutes': 60},
         'Gamer': {'rate': 6000, 'minutes': 60}
     }
+    DISCOVERY_PORT = 5001  # UDP port answering client broadcast probes
+    DISCOVERY_PROBE = b'WARNET_DISCOVER'
+    IMPORT_CHUNK_SIZE = 10000  # Rows per transaction in bulk_import
+    MAX_TOPUP_HOURS = 10000  # Largest single top-up, keeps minutes within SQLite INTEGER
+    PRICING_POLL_INTERVAL = 10  # Seconds between checks for edited tariffs
+    UNKNOWN_SEAT_TYPE = 'Unknown'  # Seats that have not reported a PC type yet
+    RESERVATION_GUARD = timedelta(minutes=10)  # Walk-ins may not start this close to a booking
+    CHECKPOINT_INTERVAL = 60  # Seconds between incremental usage charges
+    WORKER_STOP_TIMEOUT = 30  # Seconds workers get to drain their sessions on shutdown
 
-    def __init__(self, host='0.0.0.0', port=5000, gui_callback=None):
+    def __init__(self, host='0.0.0.0', port=5000, gui_callback=None, db_path='warnet.db',
+                 branch='', checkpoint_interval=None, api_port=None, api_host='127.0.0.1',
+                 api_token=None, record_path=None, workers=None):
         self.host = host
         self.port = port
+        # Supervisor mode: `workers` processes share the port via SO_REUSEPORT
+        if workers and not hasattr(socket, 'SO_REUSEPORT'):
+            print("SO_REUSEPORT is not available on this platform, running a single process")
+            workers = None
+        if workers and record_path:
+            print("Traffic capture needs a single process, --record ignored")
+            record_path = None
+        self.workers = workers
+        self.worker_processes = {}   # worker_id -> Process (supervisor)
+        self.worker_controls = {}    # worker_id -> control Queue (supervisor)
+        self.worker_events = None    # Queue the workers report to (supervisor)
+        self.worker_seats = {}       # seat_id -> {worker_id: state} (supervisor)
+        self.workers_ready = threading.Event()
+        self.worker_events_lock = threading.Lock()  # One thread at a time applies worker events
+        self.quiet_workers = False   # Send worker output to the null device (benchmarks)
+        self.worker_id = None
+        self.supervisor_events = None  # Queue to the supervisor (worker)
+        # Optional traffic capture for replay (see ProtocolRecorder)
+        self.recorder = None
+        if record_path:
+            try:
+                self.recorder = ProtocolRecorder(record_path)
+            except FileExistsError:
+                print(f"Capture {record_path} already exists, --record ignored")
+        self.connection_ids = itertools.count(1)
+        self.api_address = (api_host, api_port) if api_port else None
+        self.api_token = api_token
+        self.api_server = None
+        self.checkpoint_interval = checkpoint_interval or self.CHECKPOINT_INTERVAL
+        self.db_path = db_path
+        self.branch = branch  # Selects per-branch rate overrides
+        self.pricing = {}
+        self.packages = {}
+        self.pricing_rows = None
+
+        # Seat inventory: persisted in the seats table, occupancy kept in memory
+        self.seats = {}        # seat_id -> seat info and live state
+        self.seat_ids = {}     # (reported_ip, hostname) -> seat_id
+        self.occupancy = {}    # pc_type -> {'offline': n, 'free': n, 'busy': n}
+        self.seat_lock = threading.Lock()
+
+        # Reservations: one IntervalIndex of timestamps per seat
+        self.reservations = {}      # seat_id -> IntervalIndex
+        self.reservation_info = {}  # reservation id -> (seat_id, username, start, end)
+        self.reservation_lock = threading.Lock()
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.clients = {}
         self.running = True
-        self.gui_callback = gui_callback  # Callback to update GUI
+        self.shut_down = False
+        self.bus = EventBus()  # Live client, session and balance events
+        if gui_callback:
+            # Older embedders only want to hear that the client list changed
+            self.bus.add_listener(lambda event: event['kind'] in ('client_connected', 'client_left')
+                                  and gui_callback())
+        # Serializes use of the shared connection. No statement may hold a read
+        # snapshot while another thread writes, or a write racing a worker
+        # process fails with 'database is locked' instead of waiting.
+        self.db_lock = threading.RLock()
         
         # Get server IP
         self.server_ip = self.get_local_ip()
@@ -54,9 +415,11 @@ class WarnetAdmin:
             return '127.0.0.1'
 
     def setup_database(self):
-        self.conn = sqlite3.connect('warnet.db', check_same_thread=False)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.cur = self.conn.cursor()
         self.cur.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
             CREATE TABLE IF NOT EXISTS users (
                 username TEXT PRIMARY KEY,
                 password TEXT,
@@ -70,42 +433,930 @@ class WarnetAdmin:
                 duration INTEGER,
                 pc_type TEXT DEFAULT 'Normal'
             );
+            CREATE TABLE IF NOT EXISTS open_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                client_ip TEXT,
+                username TEXT,
+                pc_type TEXT,
+                seat_id INTEGER,
+                start_time TIMESTAMP,
+                last_checkpoint TIMESTAMP,
+                charged INTEGER DEFAULT 0,
+                worker INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS pc_rates (
+                pc_type TEXT,
+                branch TEXT DEFAULT '',
+                rate INTEGER,
+                PRIMARY KEY (pc_type, branch)
+            );
+            CREATE TABLE IF NOT EXISTS tariffs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pc_type TEXT,
+                branch TEXT DEFAULT '',
+                days TEXT DEFAULT '0123456',
+                start_minute INTEGER DEFAULT 0,
+                end_minute INTEGER DEFAULT 1440,
+                rate INTEGER,
+                priority INTEGER DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS seats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reported_ip TEXT,
+                hostname TEXT,
+                pc_type TEXT,
+                first_seen TIMESTAMP,
+                last_seen TIMESTAMP,
+                UNIQUE (reported_ip, hostname)
+            );
+            CREATE TABLE IF NOT EXISTS reservations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                seat_id INTEGER,
+                username TEXT,
+                start_time TIMESTAMP,
+                end_time TIMESTAMP,
+                created TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS reservations_end ON reservations (end_time);
+            CREATE TABLE IF NOT EXISTS packages (
+                name TEXT,
+                branch TEXT DEFAULT '',
+                pc_type TEXT,
+                hours REAL,
+                price INTEGER,
+                PRIMARY KEY (name, branch)
+            );
         ''')
+        # Journals created before incremental charging lack the charged column
+        columns = [row[1] for row in self.cur.execute('PRAGMA table_info(open_sessions)')]
+        if 'charged' not in columns:
+            self.cur.execute('ALTER TABLE open_sessions ADD COLUMN charged INTEGER DEFAULT 0')
+        # ...and the worker that owns the session (NULL for a single process)
+        if 'worker' not in columns:
+            self.cur.execute('ALTER TABLE open_sessions ADD COLUMN worker INTEGER')
+
+        # Seed the list prices so existing installs keep their old rates
+        self.cur.executemany('INSERT OR IGNORE INTO pc_rates (pc_type, branch, rate) VALUES (?, \'\', ?)',
+                             [(pc_type, category['rate'])
+                              for pc_type, category in self.PC_CATEGORIES.items()])
         self.conn.commit()
+        self.reload_pricing()
+        self.load_seats()
+        self.load_reservations()
+
+    def load_pricing_rows(self):
+        """Read the pricing tables rows that apply to this branch"""
+        with self.db_lock:
+            rates = self.conn.execute('''
+                SELECT pc_type, branch, rate FROM pc_rates
+                WHERE branch = '' OR branch = ? ORDER BY pc_type, branch
+            ''', (self.branch,)).fetchall()
+            # Branch-specific windows override global ones, then by priority
+            tariffs = self.conn.execute('''
+                SELECT pc_type, days, start_minute, end_minute, rate FROM tariffs
+                WHERE branch = '' OR branch = ? ORDER BY branch != '', priority, id
+            ''', (self.branch,)).fetchall()
+            packages = self.conn.execute('''
+                SELECT name, branch, pc_type, hours, price FROM packages
+                WHERE branch = '' OR branch = ? ORDER BY name, branch
+            ''', (self.branch,)).fetchall()
+        return rates, tariffs, packages
+
+    def reload_pricing(self, force=True):
+        """Compile the pricing tables into per-type RateTables.
+
+        Returns True if anything changed. The new tables are swapped in
+        whole, so sessions being settled never see a half-built table.
+        """
+        rows = self.load_pricing_rows()
+        if not force and rows == self.pricing_rows:
+            return False
+        rates, tariffs, packages = rows
+
+        base_rates = {}
+        for pc_type, branch, rate in rates:
+            # Rows are ordered so the branch override comes last
+            base_rates[pc_type] = rate
+
+        pricing = {}
+        for pc_type, base_rate in base_rates.items():
+            windows = [([int(day) for day in days if day.isdigit() and int(day) < 7],
+                        start, end, rate)
+                       for tariff_type, days, start, end, rate in tariffs
+                       if tariff_type == pc_type]
+            pricing[pc_type] = RateTable(base_rate, windows)
+
+        package_table = {}
+        for name, branch, pc_type, hours, price in packages:
+            if pc_type in pricing:
+                package_table[name] = {'pc_type': pc_type, 'hours': hours, 'price': price}
+
+        self.pricing = pricing
+        self.packages = package_table
+        self.pricing_rows = rows
+        print(f"Pricing loaded: {len(pricing)} PC types, {len(tariffs)} tariff windows, "
+              f"{len(package_table)} packages")
+        return True
+
+    def pricing_watcher(self):
+        """Hot-reload pricing when another connection edits the database"""
+        conn = sqlite3.connect(self.db_path)
+        last_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        while self.running:
+            time.sleep(self.PRICING_POLL_INTERVAL)
+            if not self.running:
+                break
+            try:
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+                if version != last_version:
+                    last_version = version
+                    self.reload_pricing(force=False)
+            except Exception as e:
+                print(f"Pricing reload error: {e}")
+        conn.close()
+
+    def load_seats(self):
+        """Load the seat inventory; every seat starts offline until it connects"""
+        with self.seat_lock:
+            self.seats.clear()
+            self.seat_ids.clear()
+            self.occupancy.clear()
+            with self.db_lock:
+                rows = self.conn.execute('SELECT id, reported_ip, hostname, pc_type FROM seats').fetchall()
+            for seat_id, reported_ip, hostname, pc_type in rows:
+                pc_type = pc_type or self.UNKNOWN_SEAT_TYPE
+                self.seats[seat_id] = {
+                    'reported_ip': reported_ip,
+                    'hostname': hostname,
+                    'pc_type': pc_type,
+                    'state': 'offline',
+                    'connections': 0
+                }
+                self.seat_ids[(reported_ip, hostname)] = seat_id
+                self._seat_counts(pc_type)['offline'] += 1
+
+    def _seat_counts(self, pc_type):
+        # Caller holds seat_lock
+        if pc_type not in self.occupancy:
+            self.occupancy[pc_type] = {'offline': 0, 'free': 0, 'busy': 0}
+        return self.occupancy[pc_type]
+
+    def register_seat(self, reported_ip, hostname, pc_type=None):
+        """Record a connecting seat (upserting the inventory) and mark it free"""
+        now = datetime.now()
+        seat_id = self.seat_ids.get((reported_ip, hostname))
+        if seat_id is None:
+            with self.db_lock:
+                self.conn.execute('''
+                    INSERT OR IGNORE INTO seats (reported_ip, hostname, pc_type, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (reported_ip, hostname, pc_type, now, now))
+                self.conn.commit()
+                seat_id = self.conn.execute('SELECT id FROM seats WHERE reported_ip = ? AND hostname = ?',
+                                            (reported_ip, hostname)).fetchone()[0]
+            with self.seat_lock:
+                if seat_id not in self.seats:
+                    self.seats[seat_id] = {
+                        'reported_ip': reported_ip,
+                        'hostname': hostname,
+                        'pc_type': pc_type or self.UNKNOWN_SEAT_TYPE,
+                        'state': 'offline',
+                        'connections': 0
+                    }
+                    self.seat_ids[(reported_ip, hostname)] = seat_id
+                    self._seat_counts(self.seats[seat_id]['pc_type'])['offline'] += 1
+        else:
+            with self.db_lock:
+                self.conn.execute('UPDATE seats SET last_seen = ? WHERE id = ?', (now, seat_id))
+                self.conn.commit()
+
+        with self.seat_lock:
+            self.seats[seat_id]['connections'] += 1
+        self.update_seat(seat_id, 'free', pc_type)
+        return seat_id
+
+    def update_seat(self, seat_id, state=None, pc_type=None):
+        """Move a seat to a new state and/or PC type, keeping the counts in step"""
+        if seat_id not in self.seats:
+            return
+        with self.seat_lock:
+            seat = self.seats[seat_id]
+            old_state, old_type = seat['state'], seat['pc_type']
+            new_state, new_type = state or old_state, pc_type or old_type
+            if (new_state, new_type) == (old_state, old_type):
+                return
+            self._seat_counts(old_type)[old_state] -= 1
+            self._seat_counts(new_type)[new_state] += 1
+            seat['state'], seat['pc_type'] = new_state, new_type
+            event = {
+                'seat_id': seat_id,
+                'reported_ip': seat['reported_ip'],
+                'hostname': seat['hostname'],
+                'pc_type': new_type,
+                'state': new_state,
+                'counts': dict(self.occupancy[new_type])
+            }
+
+        if new_type != old_type:
+            with self.db_lock:
+                self.conn.execute('UPDATE seats SET pc_type = ? WHERE id = ?', (new_type, seat_id))
+                self.conn.commit()
+        self.bus.publish('seat_changed', **event)
+
+    def release_seat(self, seat_id):
+        """A connection from the seat went away"""
+        if seat_id not in self.seats:
+            return
+        with self.seat_lock:
+            seat = self.seats[seat_id]
+            seat['connections'] = max(0, seat['connections'] - 1)
+            state = 'offline' if not seat['connections'] else 'free'
+        self.update_seat(seat_id, state)
+
+    def seat_counts(self, pc_type):
+        """Offline/free/busy seat counts for a PC type, in O(1)"""
+        with self.seat_lock:
+            return dict(self.occupancy.get(pc_type, {'offline': 0, 'free': 0, 'busy': 0}))
+
+    def occupancy_snapshot(self):
+        """Copy of the counts for every PC type"""
+        with self.seat_lock:
+            return {pc_type: dict(counts) for pc_type, counts in self.occupancy.items()}
+
+    def load_reservations(self):
+        """Index every reservation that has not ended yet"""
+        with self.reservation_lock:
+            self.reservations.clear()
+            self.reservation_info.clear()
+            with self.db_lock:
+                rows = self.conn.execute('''
+                    SELECT id, seat_id, username, start_time, end_time FROM reservations
+                    WHERE end_time > ? ORDER BY seat_id, start_time
+                ''', (datetime.now(),)).fetchall()
+            for reservation_id, seat_id, username, start, end in rows:
+                start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+                index = self.reservations.setdefault(seat_id, IntervalIndex())
+                # Rows arrive sorted, so append instead of inserting
+                index.starts.append(start.timestamp())
+                index.ends.append(end.timestamp())
+                index.ids.append(reservation_id)
+                self.reservation_info[reservation_id] = (seat_id, username, start, end)
+
+    def add_reservation(self, username, seat_id, start, end):
+        """Book seat_id for username from start to end; returns the reservation id.
+
+        With seat_id None the first free seat of the user's PC type is booked.
+        """
+        if end <= start:
+            raise ValueError("Reservation must end after it starts")
+        if end <= datetime.now():
+            raise ValueError("Reservation is already over")
+        with self.db_lock:
+            user = self.conn.execute('SELECT pc_type FROM users WHERE username = ?',
+                                     (username,)).fetchone()
+        if not user:
+            raise ValueError(f"User '{username}' does not exist")
+        if seat_id is None:
+            seat_id = self.find_free_seat(user[0], start, end)
+            if seat_id is None:
+                raise ValueError(f"No {user[0]} seat is free from {start:%Y-%m-%d %H:%M} to {end:%H:%M}")
+        seat = self.seats.get(seat_id)
+        if not seat:
+            raise ValueError(f"Seat {seat_id} does not exist")
+        if user[0] != seat['pc_type']:
+            raise ValueError(f"This account can only be used on {user[0]} PCs")
+
+        with self.reservation_lock:
+            index = self.reservations.setdefault(seat_id, IntervalIndex())
+            conflicts = index.overlapping(start.timestamp(), end.timestamp())
+            if conflicts:
+                other = self.reservation_info[conflicts[0]]
+                raise ValueError(f"Seat already reserved by {other[1]} "
+                                 f"from {other[2]:%Y-%m-%d %H:%M} to {other[3]:%H:%M}")
+            with self.db_lock:
+                cur = self.conn.execute('''
+                    INSERT INTO reservations (seat_id, username, start_time, end_time, created)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (seat_id, username, start, end, datetime.now()))
+                self.conn.commit()
+            index.add(start.timestamp(), end.timestamp(), cur.lastrowid)
+            self.reservation_info[cur.lastrowid] = (seat_id, username, start, end)
+        self.notify_workers('reservations')
+        return cur.lastrowid
+
+    def cancel_reservation(self, reservation_id):
+        with self.reservation_lock:
+            info = self.reservation_info.pop(reservation_id, None)
+            if not info:
+                raise ValueError(f"Reservation {reservation_id} does not exist")
+            self.reservations[info[0]].remove(info[2].timestamp(), reservation_id)
+            with self.db_lock:
+                self.conn.execute('DELETE FROM reservations WHERE id = ?', (reservation_id,))
+                self.conn.commit()
+        self.notify_workers('reservations')
+
+    def reservation_conflict(self, seat_id, username, start, end):
+        """Another user's reservation on seat_id overlapping [start, end), if any"""
+        with self.reservation_lock:
+            index = self.reservations.get(seat_id)
+            if not index:
+                return None
+            for reservation_id in index.overlapping(start.timestamp(), end.timestamp()):
+                info = self.reservation_info[reservation_id]
+                if info[1] != username:
+                    return info
+        return None
+
+    def next_reservation(self, seat_id, username, after):
+        """Another user's reservation on seat_id that has not ended by `after`, if any"""
+        with self.reservation_lock:
+            index = self.reservations.get(seat_id)
+            if not index:
+                return None
+            for reservation_id in index.ending_after(after.timestamp()):
+                info = self.reservation_info[reservation_id]
+                if info[1] != username:
+                    return info
+        return None
+
+    def next_free_slot(self, seat_id, after, duration):
+        """Earliest datetime >= after when seat_id is free for `duration` (timedelta)"""
+        with self.reservation_lock:
+            index = self.reservations.get(seat_id)
+            if not index:
+                return after
+            return datetime.fromtimestamp(index.next_free(after.timestamp(), duration.total_seconds()))
+
+    def find_free_seat(self, pc_type, start, end):
+        """First seat of pc_type with no reservation overlapping [start, end)"""
+        for seat_id, seat in list(self.seats.items()):
+            if seat['pc_type'] != pc_type:
+                continue
+            with self.reservation_lock:
+                index = self.reservations.get(seat_id)
+                if not index or not index.overlapping(start.timestamp(), end.timestamp()):
+                    return seat_id
+        return None
+
+    def upcoming_reservations(self):
+        """(id, seat_id, username, start, end) of reservations not yet over, by start"""
+        now = datetime.now()
+        with self.reservation_lock:
+            rows = [(reservation_id,) + info for reservation_id, info in self.reservation_info.items()
+                    if info[3] > now]
+        return sorted(rows, key=lambda row: row[3])
+
+    def set_rate(self, pc_type, rate, branch=''):
+        with self.db_lock:
+            self.conn.execute('INSERT OR REPLACE INTO pc_rates (pc_type, branch, rate) VALUES (?, ?, ?)',
+                              (pc_type, branch, rate))
+            self.conn.commit()
+        self.reload_pricing()
+
+    def add_tariff(self, pc_type, start_minute, end_minute, rate, days='0123456', branch='',
+                   priority=0):
+        if pc_type not in self.pricing:
+            raise ValueError(f"Invalid PC type. Choose from: {', '.join(self.pricing.keys())}")
+        with self.db_lock:
+            self.conn.execute('''
+                INSERT INTO tariffs (pc_type, branch, days, start_minute, end_minute, rate, priority)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (pc_type, branch, days, start_minute, end_minute, rate, priority))
+            self.conn.commit()
+        self.reload_pricing()
+
+    def set_package(self, name, pc_type, hours, price, branch=''):
+        if pc_type not in self.pricing:
+            raise ValueError(f"Invalid PC type. Choose from: {', '.join(self.pricing.keys())}")
+        with self.db_lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO packages (name, branch, pc_type, hours, price)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, branch, pc_type, hours, price))
+            self.conn.commit()
+        self.reload_pricing()
 
     def start(self):
         try:
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
-            print(f"Server started on {self.host}:{self.port}")
-            print("Waiting for clients...")
-            
-            while self.running:
-                try:
-                    client, address = self.server_socket.accept()
-                    print(f"New connection from {address}")
-                    client_thread = threading.Thread(target=self.handle_client, args=(client, address))
-                    client_thread.daemon = True
-                    client_thread.start()
-                except Exception as e:
-                    print(f"Error accepting client: {e}")
+            self.recover_sessions()
+
+            if not self.workers:
+                self.server_socket.bind((self.host, self.port))
+                self.server_socket.listen(5)
+                print(f"Server started on {self.host}:{self.port}")
+
+            discovery_thread = threading.Thread(target=self.discovery_responder)
+            discovery_thread.daemon = True
+            discovery_thread.start()
+
+            pricing_thread = threading.Thread(target=self.pricing_watcher)
+            pricing_thread.daemon = True
+            pricing_thread.start()
+
+            if self.api_address:
+                self.start_admin_api()
+
+            if self.workers:
+                # The workers accept and bill; this process only coordinates
+                self.run_supervisor()
+                return
+
+            checkpoint_thread = threading.Thread(target=self.checkpoint_loop)
+            checkpoint_thread.daemon = True
+            checkpoint_thread.start()
+
+            self.accept_clients()
 
         except Exception as e:
             print(f"Server error: {e}")
         finally:
             self.cleanup()
 
+    def accept_clients(self):
+        print("Waiting for clients...")
+        
+        while self.running:
+            try:
+                client, address = self.server_socket.accept()
+                print(f"New connection from {address}")
+                client_thread = threading.Thread(target=self.handle_client, args=(client, address))
+                client_thread.daemon = True
+                client_thread.start()
+            except Exception as e:
+                if self.running:
+                    print(f"Error accepting client: {e}")
+
+    def spawn_worker(self, worker_id):
+        options = {'host': self.host, 'port': self.port, 'db_path': self.db_path,
+                   'branch': self.branch, 'checkpoint_interval': self.checkpoint_interval}
+        context = multiprocessing.get_context('spawn')  # Never fork an open SQLite connection
+        control = context.Queue()
+        process = context.Process(target=run_worker, daemon=True,
+                                  args=(worker_id, options, control, self.worker_events,
+                                        self.quiet_workers))
+        process.start()
+        self.worker_processes[worker_id] = process
+        self.worker_controls[worker_id] = control
+
+    def run_supervisor(self):
+        """Start the worker processes and mirror their clients and seats.
+
+        The supervisor owns crash recovery, discovery and the admin API.
+        Workers send ('ready', worker_id) and ('event', worker_id, event)
+        with every event of their bus, which is folded into self.clients
+        and the seat counts and republished here, so the GUI and the API
+        see the whole venue. A worker that dies has its journaled sessions
+        settled up to their last checkpoint and is then restarted.
+        """
+        self.worker_events = multiprocessing.get_context('spawn').Queue()
+        for worker_id in range(1, self.workers + 1):
+            self.spawn_worker(worker_id)
+        print(f"Supervisor started {self.workers} workers on {self.host}:{self.port}")
+
+        ready = set()
+        next_check = time.monotonic() + 1.0
+        while self.running:
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + 1.0
+                for worker_id, process in list(self.worker_processes.items()):
+                    if self.running and not process.is_alive():
+                        print(f"Worker {worker_id} exited with code {process.exitcode}, restarting")
+                        self.forget_worker(worker_id)
+                        self.recover_sessions(worker_id)
+                        self.spawn_worker(worker_id)
+            try:
+                message = self.next_worker_message(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if message[0] == 'ready':
+                ready.add(message[1])
+                if len(ready) == self.workers:
+                    self.workers_ready.set()
+
+    def next_worker_message(self, timeout):
+        """Take one message from the workers, applying it if it is an event"""
+        with self.worker_events_lock:
+            message = self.worker_events.get(timeout=timeout)
+            if message[0] == 'event':
+                self.apply_worker_event(message[1], message[2])
+        return message
+
+    def stop_workers(self):
+        """Tell the workers to drain and wait for them, still taking their events.
+
+        A worker cannot exit before its queue feeder has flushed everything
+        it published while settling its sessions, so the events have to be
+        read until the last worker is gone. Workers that outlive
+        WORKER_STOP_TIMEOUT are terminated.
+        """
+        self.notify_workers('stop')
+        deadline = time.monotonic() + self.WORKER_STOP_TIMEOUT
+        while (time.monotonic() < deadline
+               and any(process.is_alive() for process in self.worker_processes.values())):
+            try:
+                self.next_worker_message(timeout=0.1)
+            except queue.Empty:
+                pass
+        for worker_id, process in self.worker_processes.items():
+            if process.is_alive():
+                print(f"Worker {worker_id} did not stop in time, terminating it")
+                process.terminate()
+            process.join()
+        while True:  # Whatever the last workers sent just before exiting
+            try:
+                self.next_worker_message(timeout=0.1)
+            except queue.Empty:
+                break
+        self.worker_events.close()
+
+    def apply_worker_event(self, worker_id, event):
+        """Mirror one worker's event into self.clients or the seats and republish it"""
+        kind, address = event['kind'], event.get('address')
+        if kind == 'seat_changed':
+            # update_seat republishes it with the venue-wide counts
+            self.apply_worker_seat(worker_id, event)
+            return
+        if kind == 'client_connected':
+            self.clients[address] = {
+                'socket': None,
+                'worker': worker_id,
+                'reported_ip': event['reported_ip'],
+                'hostname': event['hostname'],
+                'connected_time': event['connected_time'],
+                'seat_id': event['seat_id'],
+                'username': None,
+                'session_start': None,
+                'pc_type': None,
+                'ends_at': None
+            }
+        elif kind == 'session_started' and address in self.clients:
+            self.clients[address].update(username=event['username'], pc_type=event['pc_type'],
+                                         session_start=event['session_start'], ends_at=event['ends_at'])
+        elif kind == 'session_settled' and address in self.clients:
+            self.clients[address].update(username=None, session_start=None, ends_at=None)
+        elif kind == 'balance_changed':
+            for session_address, ends_at in event['sessions']:
+                if session_address in self.clients:
+                    self.clients[session_address]['ends_at'] = ends_at
+        elif kind == 'client_left':
+            self.clients.pop(address, None)
+        self.bus.publish_event(event)
+
+    def apply_worker_seat(self, worker_id, event):
+        """Fold one worker's view of a seat into the venue-wide state"""
+        seat_id = event['seat_id']
+        if seat_id not in self.seats:
+            # A seat first seen by a worker after this process loaded the inventory
+            with self.seat_lock:
+                self.seats[seat_id] = {
+                    'reported_ip': event['reported_ip'],
+                    'hostname': event['hostname'],
+                    'pc_type': event['pc_type'],
+                    'state': 'offline',
+                    'connections': 0
+                }
+                self.seat_ids[(event['reported_ip'], event['hostname'])] = seat_id
+                self._seat_counts(event['pc_type'])['offline'] += 1
+        states = self.worker_seats.setdefault(seat_id, {})
+        states[worker_id] = event['state']
+        # A seat reconnecting to another worker may briefly be known to two
+        merged = ('busy' if 'busy' in states.values() else
+                  'free' if 'free' in states.values() else 'offline')
+        self.update_seat(seat_id, merged, event['pc_type'])
+
+    def forget_worker(self, worker_id):
+        """Drop the clients and seat states mirrored from a worker that is gone"""
+        for address, client in list(self.clients.items()):
+            if client.get('worker') == worker_id:
+                del self.clients[address]
+                self.bus.publish('client_left', address=address)
+        for seat_id, states in list(self.worker_seats.items()):
+            if states.pop(worker_id, None):
+                merged = ('busy' if 'busy' in states.values() else
+                          'free' if 'free' in states.values() else 'offline')
+                self.update_seat(seat_id, merged)
+
+    def notify_workers(self, *message):
+        for control in list(self.worker_controls.values()):
+            control.put(message)
+
+    def notify_supervisor(self, kind, *payload):
+        if self.supervisor_events is not None:
+            self.supervisor_events.put((kind, self.worker_id) + payload)
+
+    def serve_worker(self, worker_id, control, events):
+        """Accept and bill connections as one of the supervisor's workers"""
+        self.worker_id = worker_id
+        self.supervisor_events = events
+        self.bus.add_listener(lambda event: self.notify_supervisor('event', event))
+
+        control_thread = threading.Thread(target=self.worker_control, args=(control,))
+        control_thread.daemon = True
+        control_thread.start()
+        try:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(128)
+            print(f"Worker {worker_id} accepting on {self.host}:{self.port}")
+
+            # Pricing edits reach every worker through PRAGMA data_version
+            pricing_thread = threading.Thread(target=self.pricing_watcher)
+            pricing_thread.daemon = True
+            pricing_thread.start()
+
+            checkpoint_thread = threading.Thread(target=self.checkpoint_loop)
+            checkpoint_thread.daemon = True
+            checkpoint_thread.start()
+
+            self.notify_supervisor('ready')
+            self.accept_clients()
+        except Exception as e:
+            print(f"Worker {worker_id} error: {e}")
+        finally:
+            self.cleanup()
+
+    def worker_control(self, control):
+        """Apply messages from the supervisor until told to stop"""
+        while True:
+            message = control.get()
+            if message[0] == 'reservations':
+                self.load_reservations()
+            elif message[0] == 'balance':
+                # A top-up on the supervisor moves the end of this worker's sessions
+                if any(client['username'] == message[1] for client in list(self.clients.values())):
+                    self.publish_balances([message[1]], sessions=True)
+            elif message[0] == 'stop':
+                self.running = False
+                try:
+                    self.server_socket.shutdown(socket.SHUT_RDWR)  # Wakes up accept()
+                except OSError:
+                    pass
+                return
+
+    def start_admin_api(self):
+        """Serve the HTTP/JSON admin API on its own threads"""
+        if not self.api_token and not is_loopback(self.api_address[0]):
+            print(f"Admin API disabled: --api-token is required to listen on {self.api_address[0]}")
+            return
+        try:
+            self.api_server = ThreadingHTTPServer(self.api_address, AdminRequestHandler)
+        except OSError as e:
+            print(f"Admin API disabled: {e}")
+            return
+        self.api_server.daemon_threads = True
+        self.api_server.admin = self
+        self.api_server.token = self.api_token
+        api_thread = threading.Thread(target=self.api_server.serve_forever)
+        api_thread.daemon = True
+        api_thread.start()
+        print(f"Admin API listening on http://{self.api_address[0]}:{self.api_address[1]}")
+
+    def discovery_responder(self):
+        """Answer UDP broadcast probes so clients can find the server without a typed IP"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((self.host, self.DISCOVERY_PORT))
+        except OSError as e:
+            print(f"Discovery disabled: {e}")
+            sock.close()
+            return
+
+        sock.settimeout(1.0)  # Wake up regularly to notice shutdown
+        print(f"Discovery listening on UDP port {self.DISCOVERY_PORT}")
+        while self.running:
+            try:
+                data, address = sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if data.strip() == self.DISCOVERY_PROBE:
+                reply = {'server_ip': self.server_ip, 'port': self.port}
+                try:
+                    sock.sendto(json.dumps(reply).encode(), address)
+                except OSError as e:
+                    print(f"Discovery reply error: {e}")
+        sock.close()
+
     def cleanup(self):
+        if self.shut_down:
+            return
+        self.shut_down = True
         print("\nShutting down server...")
         self.running = False
-        self.conn.close()
+        if self.api_server:
+            self.api_server.shutdown()
+        if self.recorder:
+            self.recorder.close()
+        if self.worker_processes:
+            self.stop_workers()
+            self.clients.clear()  # Only mirrors; each worker settled its own sessions
+            for worker_id, process in self.worker_processes.items():
+                if process.exitcode:
+                    # Died instead of draining: settle what it left in the journal
+                    self.recover_sessions(worker_id)
+
+        # Drain: settle every active session in one transaction
+        settled = self.settle_sessions(list(self.clients))
+        print(f"Settled {len(settled)} active sessions")
+
+        for client in list(self.clients.values()):
+            try:
+                client['socket'].close()
+            except:
+                pass
+        with self.db_lock:
+            self.conn.close()
         self.server_socket.close()
 
+    def open_session(self, address, username, pc_type):
+        """Start billing a login and record it in the open-session journal"""
+        if self.clients[address]['username']:
+            self.settle_session(address)
+
+        client = self.clients[address]
+        session_start = datetime.now()
+        with self.db_lock:
+            cur = self.conn.execute('''
+                INSERT INTO open_sessions (client_ip, username, pc_type, seat_id, start_time, last_checkpoint,
+                                           worker)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (client['reported_ip'], username, pc_type, client['seat_id'], session_start, session_start,
+                  self.worker_id))
+            self.conn.commit()
+        client['journal_id'] = cur.lastrowid
+        client['charged'] = 0  # Balance minutes already debited by checkpoints
+        client['username'] = username
+        client['session_start'] = session_start
+        client['pc_type'] = pc_type
+        client['ends_at'] = time.time() + self.session_remaining_seconds(address)
+        self.bus.publish('session_started', address=address, username=username, pc_type=pc_type,
+                         seat_id=client['seat_id'], session_start=session_start,
+                         ends_at=client['ends_at'])
+        self.update_seat(client['seat_id'], 'busy', pc_type)
+
+    def settle_session(self, address):
+        """Charge and log the session on address; safe to call more than once"""
+        return self.settle_sessions([address])
+
+    def settle_sessions(self, addresses, end=None):
+        """Charge, log and close the journal entries of several sessions in one transaction"""
+        end = end or datetime.now()
+        settled = []
+        with self.db_lock:
+            for address in addresses:
+                client = self.clients.get(address)
+                if not client or not client['username'] or not client['session_start']:
+                    continue
+                start = client['session_start']
+                settled.append({
+                    'address': address,
+                    'username': client['username'],
+                    'client_ip': client['reported_ip'],
+                    'pc_type': client['pc_type'],
+                    'seat_id': client['seat_id'],
+                    'journal_id': client.get('journal_id'),
+                    'start': start,
+                    # Checkpoints already debited part of it
+                    'charged': self.charge_minutes(client['pc_type'], start, end) - client.get('charged', 0),
+                    'duration': int((end - start).total_seconds() / 60)
+                })
+                # Clear first so a racing disconnect cannot settle it twice
+                client['username'] = None
+                client['session_start'] = None
+                client['journal_id'] = None
+                client['charged'] = 0
+                client['ends_at'] = None
+            if not settled:
+                return []
+
+            try:
+                with self.conn:
+                    self.conn.executemany('''
+                        UPDATE users 
+                        SET balance = balance - ? 
+                        WHERE username = ?
+                    ''', [(session['charged'], session['username']) for session in settled])
+                    self.conn.executemany('''
+                        INSERT INTO sessions (client_ip, username, start_time, duration, pc_type)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', [(session['client_ip'], session['username'], session['start'],
+                           session['duration'], session['pc_type']) for session in settled])
+                    self.conn.executemany('DELETE FROM open_sessions WHERE id = ?',
+                                          [(session['journal_id'],) for session in settled])
+            except Exception as e:
+                # Journal rows survive, so recover_sessions settles them on next start
+                print(f"Settlement error: {e}")
+                return []
+
+        for session in settled:
+            self.bus.publish('session_settled', address=session['address'],
+                             username=session['username'], charged=session['charged'],
+                             duration=session['duration'])
+            self.update_seat(session['seat_id'], 'free')
+            print(f"Updated balance for {session['username']} - "
+                  f"Used: {session['duration'] / 60:.2f} hours")
+        self.publish_balances([session['username'] for session in settled])
+        return settled
+
+    def checkpoint_sessions(self):
+        """Charge the usage of every open session since its last checkpoint.
+
+        All sessions are coalesced into one transaction per tick: one
+        executemany on users (deltas summed per user) and one on the
+        journal, however many seats are active.
+        """
+        now = datetime.now()
+        with self.db_lock:
+            deltas = {}
+            journal = []
+            totals = []
+            for client in list(self.clients.values()):
+                if not client.get('journal_id') or not client['session_start']:
+                    continue
+                total = self.charge_minutes(client['pc_type'], client['session_start'], now)
+                delta = total - client['charged']
+                if delta > 0:
+                    deltas[client['username']] = deltas.get(client['username'], 0) + delta
+                journal.append((now, total, client['journal_id']))
+                totals.append((client, total))
+            if not journal:
+                return 0
+
+            with self.conn:
+                self.conn.executemany('''
+                    UPDATE users 
+                    SET balance = balance - ? 
+                    WHERE username = ?
+                ''', [(delta, username) for username, delta in deltas.items()])
+                self.conn.executemany('UPDATE open_sessions SET last_checkpoint = ?, charged = ? WHERE id = ?',
+                                      journal)
+            for client, total in totals:
+                client['charged'] = total
+        self.publish_balances(list(deltas))
+        return len(journal)
+
+    def checkpoint_loop(self):
+        while self.running:
+            time.sleep(self.checkpoint_interval)
+            if not self.running:
+                break
+            try:
+                self.checkpoint_sessions()
+            except Exception as e:
+                print(f"Checkpoint error: {e}")
+
+    def recover_sessions(self, worker_id=None):
+        """Settle sessions orphaned by a crash, billed up to their last checkpoint.
+
+        With worker_id, only the sessions of that (dead) worker process.
+        Everything is reconciled in a single transaction.
+        """
+        started = time.perf_counter()
+        with self.db_lock:
+            rows = self.conn.execute(f'''
+                SELECT id, client_ip, username, pc_type, start_time, last_checkpoint, charged
+                FROM open_sessions {'WHERE worker = ?' if worker_id else ''}
+            ''', (worker_id,) if worker_id else ()).fetchall()
+            if not rows:
+                return 0
+
+            charges, logs = [], []
+            for journal_id, client_ip, username, pc_type, start, last_checkpoint, charged in rows:
+                start = datetime.fromisoformat(start)
+                end = datetime.fromisoformat(last_checkpoint)
+                total = self.charge_minutes(pc_type, start, end) if pc_type in self.pricing else 0
+                charges.append((max(0, total - (charged or 0)), username))
+                logs.append((client_ip, username, start, int((end - start).total_seconds() / 60),
+                             pc_type))
+
+            with self.conn:
+                self.conn.executemany('''
+                    UPDATE users 
+                    SET balance = balance - ? 
+                    WHERE username = ?
+                ''', charges)
+                self.conn.executemany('''
+                    INSERT INTO sessions (client_ip, username, start_time, duration, pc_type)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', logs)
+                if worker_id:
+                    self.conn.executemany('DELETE FROM open_sessions WHERE id = ?', [(row[0],) for row in rows])
+                else:
+                    self.conn.execute('DELETE FROM open_sessions WHERE id <= ?', (max(row[0] for row in rows),))
+
+        print(f"Recovered {len(rows)} orphaned sessions in {time.perf_counter() - started:.3f}s")
+        return len(rows)
+
     def add_user(self, username, password):
         try:
-            self.cur.execute('INSERT INTO users (username, password) VALUES (?, ?)', 
-                           (username, password))
-            self.conn.commit()
+            with self.db_lock:
+                self.cur.execute('INSERT INTO users (username, password) VALUES (?, ?)', 
+                               (username, password))
+                self.conn.commit()
             return True
         except sqlite3.IntegrityError:
             print(f"Username {username} already exists")
@@ -113,22 +1364,60 @@ class WarnetAdmin:
 
     def convert_hours_to_minutes(self, hours, pc_type='Normal'):
         """Convert hours to minutes based on PC type"""
-        return int(hours * self.PC_CATEGORIES[pc_type]['minutes'])
+        return int(hours * self.PC_CATEGORIES.get(pc_type, {'minutes': 60})['minutes'])
 
     def calculate_price(self, hours, pc_type='Normal'):
         """Calculate price based on hours and PC type"""
-        return hours * self.PC_CATEGORIES[pc_type]['rate']
+        return hours * self.pricing[pc_type].base_rate
 
-    def add_balance(self, username, hours, pc_type='Normal'):
-        try:
-            # Validate input
-            if not isinstance(hours, (int, float)):
-                raise ValueError("Hours must be a number")
-            if hours <= 0:
-                raise ValueError("Hours must be greater than 0")
-            if pc_type not in self.PC_CATEGORIES:
-                raise ValueError(f"Invalid PC type. Choose from: {', '.join(self.PC_CATEGORIES.keys())}")
-                
+    def usage_minutes(self, pc_type, start, end):
+        """Balance minutes used between start and end, unrounded.
+
+        Balance is kept in minutes at the list rate, so a happy-hour minute
+        costs less than one balance minute.
+        """
+        table = self.pricing[pc_type]
+        if not table.base_rate:
+            return 0
+        return table.cost(start, end) * 60 / table.base_rate
+
+    def charge_minutes(self, pc_type, start, end):
+        """Whole balance minutes to debit for start..end (truncated like before)"""
+        return int(self.usage_minutes(pc_type, start, end))
+
+    def balance_seconds(self, balance, pc_type, start=None):
+        """Real seconds a balance (in list-rate minutes) lasts from start"""
+        table = self.pricing[pc_type]
+        budget = balance * table.base_rate / 60
+        seconds = table.seconds_affordable(start or datetime.now(), budget)
+        if seconds == float('inf'):
+            # Free all week; fall back to counting list-rate minutes
+            return max(0, balance * 60)
+        return seconds
+
+    def add_package(self, username, package_name):
+        """Top up a user with a package bundle; returns its price"""
+        package = self.packages.get(package_name)
+        if not package:
+            raise ValueError(f"Unknown package '{package_name}'")
+        self.credit_balance(username, package['hours'], package['pc_type'])
+        return package['price']
+
+    def credit_balance(self, username, hours, pc_type='Normal'):
+        """Top up a user; raises ValueError instead of showing a dialog"""
+        # Validate input
+        if not isinstance(hours, (int, float)) or isinstance(hours, bool):
+            raise ValueError("Hours must be a number")
+        if not math.isfinite(hours):
+            raise ValueError("Hours must be a finite number")
+        if hours <= 0:
+            raise ValueError("Hours must be greater than 0")
+        if hours > self.MAX_TOPUP_HOURS:
+            raise ValueError(f"Hours cannot exceed {self.MAX_TOPUP_HOURS:,}")
+        if pc_type not in self.pricing:
+            raise ValueError(f"Invalid PC type. Choose from: {', '.join(self.pricing.keys())}")
+
+        with self.db_lock:
             # Check if user exists
             self.cur.execute('SELECT username FROM users WHERE username = ?', (username,))
             user = self.cur.fetchone()
@@ -140,12 +1429,50 @@ class WarnetAdmin:
             minutes = self.convert_hours_to_minutes(hours, pc_type)
             
             # Add balance
-            self.cur.execute('''
-                UPDATE users 
-                SET balance = balance + ?, pc_type = ? 
-                WHERE username = ?
-            ''', (minutes, pc_type, username))
-            self.conn.commit()
+            try:
+                self.cur.execute('''
+                    UPDATE users 
+                    SET balance = balance + ?, pc_type = ? 
+                    WHERE username = ?
+                ''', (minutes, pc_type, username))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        # Workers own the sessions, so they re-estimate when those run out
+        self.publish_balances([username], sessions=not self.workers)
+        self.notify_workers('balance', username)
+        return minutes
+
+    def publish_balances(self, usernames, sessions=False):
+        """Publish balance_changed for each user.
+
+        With sessions=True (after a top-up) the end of each of their
+        running sessions is re-estimated and sent along as
+        [(address, ends_at), ...].
+        """
+        if not self.bus.active or not usernames:
+            return
+        usernames = sorted(set(usernames))
+        balances = []
+        with self.db_lock:
+            for offset in range(0, len(usernames), 500):
+                chunk = usernames[offset:offset + 500]
+                balances += self.conn.execute(
+                    f"SELECT username, balance FROM users WHERE username IN ({', '.join('?' * len(chunk))})",
+                    chunk).fetchall()
+        for username, balance in balances:
+            ends = []
+            if sessions:
+                for address, client in list(self.clients.items()):
+                    if client['username'] == username and client['session_start']:
+                        client['ends_at'] = time.time() + self.session_remaining_seconds(address)
+                        ends.append((address, client['ends_at']))
+            self.bus.publish('balance_changed', username=username, balance=balance, sessions=ends)
+
+    def add_balance(self, username, hours, pc_type='Normal'):
+        try:
+            self.credit_balance(username, hours, pc_type)
             return True
             
         except ValueError as ve:
@@ -154,28 +1481,130 @@ class WarnetAdmin:
         except Exception as e:
             print(f"Add balance error: {e}")
             messagebox.showerror("Error", f"Failed to add balance: {str(e)}")
-            self.conn.rollback()
             return False
 
+    def bulk_import(self, rows, chunk_size=None):
+        """Create users and top up balances from (line_no, row) pairs.
+
+        Each row may have username, password, hours and pc_type. A password
+        creates the user; hours top up the balance like add_balance. Valid
+        rows are applied with executemany, one transaction per chunk, and
+        invalid rows are skipped and reported instead of aborting the import.
+        """
+        chunk_size = chunk_size or self.IMPORT_CHUNK_SIZE
+        with self.db_lock:
+            known = {row[0] for row in self.conn.execute('SELECT username FROM users')}
+        report = {'rows': 0, 'users_added': 0, 'topups': 0, 'errors': []}
+        new_users, topups, lines = [], [], []
+        chunk_topups = [0]
+
+        def flush():
+            try:
+                with self.db_lock, self.conn:
+                    self.conn.executemany('''
+                        INSERT INTO users (username, password, balance, pc_type)
+                        VALUES (?, ?, ?, ?)
+                    ''', new_users)
+                    self.conn.executemany('''
+                        UPDATE users 
+                        SET balance = balance + ?, pc_type = ? 
+                        WHERE username = ?
+                    ''', topups)
+                report['users_added'] += len(new_users)
+                report['topups'] += chunk_topups[0]
+            except Exception as e:
+                print(f"Bulk import chunk failed: {e}")
+                known.difference_update(user[0] for user in new_users)
+                report['errors'].extend((line, username, f"Chunk rolled back: {e}")
+                                        for line, username in lines)
+            new_users.clear()
+            topups.clear()
+            lines.clear()
+            chunk_topups[0] = 0
+
+        for line, row in rows:
+            report['rows'] += 1
+            username = (row.get('username') or '').strip()
+            password = row.get('password') or ''
+            hours = (row.get('hours') or '').strip()
+            pc_type = (row.get('pc_type') or '').strip() or 'Normal'
+            try:
+                if not username:
+                    raise ValueError("Username is required")
+                try:
+                    hours = float(hours) if hours else 0
+                except ValueError:
+                    raise ValueError("Hours must be a number")
+                if not math.isfinite(hours):
+                    raise ValueError("Hours must be a finite number")
+                if hours < 0:
+                    raise ValueError("Hours cannot be negative")
+                if hours > self.MAX_TOPUP_HOURS:
+                    raise ValueError(f"Hours cannot exceed {self.MAX_TOPUP_HOURS:,}")
+                if pc_type not in self.pricing:
+                    raise ValueError(f"Invalid PC type. Choose from: {', '.join(self.pricing.keys())}")
+                if password:
+                    if username in known:
+                        raise ValueError(f"Username {username} already exists")
+                elif username not in known:
+                    raise ValueError(f"User '{username}' does not exist")
+                elif not hours:
+                    raise ValueError("Nothing to import: no password or hours")
+            except ValueError as ve:
+                report['errors'].append((line, username, str(ve)))
+                continue
+
+            minutes = self.convert_hours_to_minutes(hours, pc_type)
+            if password:
+                # New users get their first top-up in the INSERT itself
+                known.add(username)
+                new_users.append((username, password, minutes, pc_type))
+            elif hours:
+                topups.append((minutes, pc_type, username))
+            if hours:
+                chunk_topups[0] += 1
+            lines.append((line, username))
+
+            if len(lines) >= chunk_size:
+                flush()
+        flush()
+        return report
+
+    def import_csv(self, path, chunk_size=None):
+        """Stream a users/top-up CSV file through bulk_import"""
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            return self.bulk_import(((reader.line_num, row) for row in reader), chunk_size)
+
+    def user_rows(self):
+        """(username, password, balance, pc_type) of every user"""
+        with self.db_lock:
+            return self.conn.execute('SELECT username, password, balance, pc_type FROM users').fetchall()
+
     def list_users(self):
-        self.cur.execute('SELECT username, balance FROM users')
-        users = self.cur.fetchall()
+        users = self.user_rows()
         print("\nCurrent Users:")
         print("Username | Balance (minutes)")
         print("-" * 30)
         for user in users:
-            print(f"{user[0]} | {user[1]}")
+            print(f"{user[0]} | {user[2]}")
+
+    def record(self, conn_id, event, **fields):
+        if self.recorder:
+            self.recorder.record(conn_id, event, **fields)
 
     def handle_client(self, client_socket, address):
+        conn_id = next(self.connection_ids)
+        self.record(conn_id, 'connect')
         try:
             # Send identify request and get client info
             client_socket.send("IDENTIFY".encode())
-            client_data = client_socket.recv(1024).decode()
-            client_info = json.loads(client_data)
-            
-            session_start = None
-            current_user = None
-            pc_type = None
+            requests = self.read_messages(client_socket)
+            client_info = next(requests)
+            if self.recorder:
+                self.record(conn_id, 'identify', pc_type=client_info.get('pc_type'),
+                            seat=self.recorder.anonymize(
+                                f"{client_info.get('client_ip')}/{client_info.get('hostname')}"))
             
             self.clients[address] = {
                 'socket': client_socket,
@@ -184,83 +1613,115 @@ class WarnetAdmin:
                 'connected_time': datetime.now(),
                 'username': None,
                 'session_start': None,
-                'pc_type': None
+                'pc_type': None,
+                'seat_id': None,
+                'journal_id': None,
+                'ends_at': None  # Estimated time.time() the balance runs out
             }
+            self.clients[address]['seat_id'] = self.register_seat(
+                client_info.get('client_ip'), client_info.get('hostname'), client_info.get('pc_type'))
+            self.bus.publish('client_connected', address=address,
+                             reported_ip=self.clients[address]['reported_ip'],
+                             hostname=self.clients[address]['hostname'],
+                             seat_id=self.clients[address]['seat_id'],
+                             connected_time=self.clients[address]['connected_time'])
 
             while True:
                 try:
-                    data = client_socket.recv(1024).decode()
-                    if not data:
+                    request = next(requests, None)
+                    if request is None:
                         break
                     
-                    request = json.loads(data)
                     if request.get('command') == 'login':
                         response = self.verify_credentials(
                             request.get('username'),
                             request.get('password'),
-                            request.get('pc_type')  # Include PC type in verification
+                            request.get('pc_type'),  # Include PC type in verification
+                            self.clients[address]['seat_id']
                         )
+                        if self.recorder:
+                            self.record(conn_id, 'login', pc_type=request.get('pc_type'),
+                                        user=self.recorder.anonymize(request.get('username')),
+                                        ok=int(response['status'] == 'success'))
                         if response['status'] == 'success':
-                            current_user = request.get('username')
-                            session_start = datetime.now()
-                            self.clients[address]['username'] = current_user
-                            self.clients[address]['session_start'] = session_start
-                            self.clients[address]['pc_type'] = request.get('pc_type')
+                            self.open_session(address, request.get('username'), request.get('pc_type'))
                             
                         client_socket.send(json.dumps(response).encode())
                     elif request.get('command') == 'stop_session':
-                        if current_user:
-                            session_end = datetime.now()
-                            time_used = (session_end - session_start).total_seconds() / 3600
-                            
-                            # Update user balance
-                            self.cur.execute('''
-                                UPDATE users 
-                                SET balance = balance - ? 
-                                WHERE username = ?
-                            ''', (int(time_used * 60), current_user))
-                            
-                            # Log session
-                            self.cur.execute('''
-                                INSERT INTO sessions (client_ip, username, start_time, duration, pc_type)
-                                VALUES (?, ?, ?, ?, ?)
-                            ''', (client_info.get('client_ip'), current_user, session_start, 
-                                int(time_used * 60), self.clients[address]['pc_type']))
-                            
-                            self.conn.commit()
+                        self.record(conn_id, 'stop_session')
+                        if self.clients[address]['username']:
+                            self.settle_session(address)
                             client_socket.send(json.dumps({'status': 'success'}).encode())
                             break
+                    elif request.get('command') == 'sync':
+                        self.record(conn_id, 'sync')
+                        # Let the client reconcile its countdown with the billed balance
+                        client_socket.send(json.dumps({
+                            'status': 'success',
+                            'remaining_seconds': self.session_remaining_seconds(address)
+                        }).encode())
                 except Exception as e:
                     print(f"Error handling client request: {e}")
                     break
 
             # Client disconnected - Update balance
-            if current_user and session_start:
-                session_end = datetime.now()
-                time_used = (session_end - session_start).total_seconds() / 3600
-                
-                # Update user balance
-                self.cur.execute('''
-                    UPDATE users 
-                    SET balance = balance - ? 
-                    WHERE username = ?
-                ''', (int(time_used * 60), current_user))
-                
-                # Log session
-                self.cur.execute('''
-                    INSERT INTO sessions (client_ip, username, start_time, duration, pc_type)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (client_info.get('client_ip'), current_user, session_start, 
-                    int(time_used * 60), self.clients[address]['pc_type']))
-                
-                self.conn.commit()
-                print(f"Updated balance for {current_user} - Used: {time_used:.2f} hours")
+            self.settle_session(address)
                 
             self.remove_client(address)
                 
         except Exception as e:
             print(f"Error handling client: {e}")
+            self.settle_session(address)
             self.remove_client(address)
+        finally:
+            self.record(conn_id, 'disconnect')
+
+    def read_messages(self, client_socket):
+        """Yield the JSON messages a client sends, in order.
+
+        Messages are not framed, so under load one read can hold more
+        than one of them (or part of one); they are split with raw_decode.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ''
+        while True:
+            data = client_socket.recv(1024).decode()
+            if not data:
+                return
+            buffer += data
+            while buffer:
+                try:
+                    message, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    if len(buffer) > 65536:
+                        raise
+                    break  # Wait for the rest of the message
+                yield message
+                buffer = buffer[end:].lstrip()
+
+    def session_remaining_seconds(self, address):
+        """Authoritative seconds left for the session on `address`"""
+        client = self.clients.get(address)
+        if not client or not client['username'] or not client['session_start']:
+            return 0
+
+        with self.db_lock:
+            user = self.conn.execute('SELECT balance FROM users WHERE username = ?',
+                                     (client['username'],)).fetchone()
+        if not user:
+            return 0
+
+        # Balance already reflects the usage charged by checkpoints. Use the
+        # unrounded usage: whole minutes would make the reply jump once a minute.
+        now = datetime.now()
+        balance = user[0] - (self.usage_minutes(client['pc_type'], client['session_start'], now)
+                             - client.get('charged', 0))
+        seconds = self.balance_seconds(balance, client['pc_type'], now)
+        reservation = self.next_reservation(client['seat_id'], client['username'], now)
+        if reservation:
+            # The seat has to be free when the next booking starts
+            seconds = min(seconds, (reservation[2] - now).total_seconds())
+        return max(0, int(seconds))
 
     def remove_client(self, address):
         """Remove client and update GUI"""
@@ -269,12 +1730,10 @@ class WarnetAdmin:
                 self.clients[address]['socket'].close()
             except:
                 pass
+            self.release_seat(self.clients[address].get('seat_id'))
             del self.clients[address]
+            self.bus.publish('client_left', address=address)
             print(f"Client disconnected: {address}")
-            
-            # Update GUI if callback exists
-            if self.gui_callback:
-                self.gui_callback()
 
     def process_request(self, request, address):
         try:
@@ -288,31 +1747,7 @@ class WarnetAdmin:
                 )
             elif command == 'stop_session':
                 # Handle early session termination
-                username = request.get('username')
-                remaining_seconds = request.get('remaining_seconds')
-                
-                if username in self.clients[address]:
-                    session_start = self.clients[address]['session_start']
-                    session_end = datetime.now()
-                    time_used = (session_end - session_start).total_seconds() / 3600
-                    
-                    # Update user balance
-                    self.cur.execute('''
-                        UPDATE users 
-                        SET balance = balance - ? 
-                        WHERE username = ?
-                    ''', (int(time_used * 60), username))
-                    
-                    # Log session
-                    self.cur.execute('''
-                        INSERT INTO sessions (client_ip, username, start_time, duration, pc_type)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (self.clients[address]['reported_ip'], username, session_start, 
-                        int(time_used * 60), self.clients[address]['pc_type']))
-                    
-                    self.conn.commit()
-                    print(f"Updated balance for {username} - Used: {time_used:.2f} hours")
-                
+                self.settle_session(address)
                 return {'status': 'success'}
                 
             return {'status': 'error', 'message': 'Invalid command'}
@@ -320,18 +1755,18 @@ class WarnetAdmin:
             print(f"Process request error: {e}")
             return {'status': 'error', 'message': str(e)}
 
-    def verify_credentials(self, username, password, pc_type):
+    def verify_credentials(self, username, password, pc_type, seat_id=None):
         try:
             if not username or not password:
                 return {'status': 'error', 'message': 'Username and password required'}
 
-            # First check regular users
-            self.cur.execute('''
-                SELECT username, balance, pc_type
-                FROM users 
-                WHERE username = ? AND password = ?
-            ''', (username, password))
-            user = self.cur.fetchone()
+            # First check regular users (own cursor: logins run on many threads at once)
+            with self.db_lock:
+                user = self.conn.execute('''
+                    SELECT username, balance, pc_type
+                    FROM users 
+                    WHERE username = ? AND password = ?
+                ''', (username, password)).fetchone()
             
             if user:
                 if user[1] <= 0:  # Check balance
@@ -339,10 +1774,22 @@ class WarnetAdmin:
                 
                 if user[2] != pc_type:
                     return {'status': 'error', 'message': f'This account can only be used on {user[2]} PCs'}
+
+                # Real playing time left under the current tariffs
+                now = datetime.now()
+                seconds = self.balance_seconds(user[1], user[2], now)
+
+                if seat_id is not None:
+                    reservation = self.next_reservation(seat_id, username, now)
+                    if reservation and reservation[2] - now < self.RESERVATION_GUARD:
+                        return {'status': 'error', 'message':
+                                f'This PC is reserved from {reservation[2]:%H:%M} to {reservation[3]:%H:%M}'}
+                    if reservation:
+                        # Walk-ins may play until the booking starts, not past it
+                        seconds = min(seconds, (reservation[2] - now).total_seconds())
                 
                 print(f"Regular user login: {username}")
-                hours = user[1] / 60  # Convert minutes to hours
-                return {'status': 'success', 'balance': hours}
+                return {'status': 'success', 'balance': seconds / 3600}
             
             return {'status': 'error', 'message': 'Invalid credentials'}
             
@@ -351,15 +1798,16 @@ class WarnetAdmin:
             return {'status': 'error', 'message': 'Login verification failed'}
 
     def handle_login(self, username, password):
-        self.cur.execute('SELECT * FROM users WHERE username=? AND password=?',
-                        (username, password))
-        user = self.cur.fetchone()
+        with self.db_lock:
+            user = self.conn.execute('SELECT * FROM users WHERE username=? AND password=?',
+                                     (username, password)).fetchone()
         if user:
             return {'status': 'success', 'balance': user[2]}
         return {'status': 'error', 'message': 'Invalid credentials'}
 
-    def delete_user(self, username):
-        try:
+    def remove_user(self, username):
+        """Delete a user; raises ValueError instead of showing a dialog"""
+        with self.db_lock:
             # Check if user exists
             self.cur.execute('SELECT username FROM users WHERE username = ?', (username,))
             user = self.cur.fetchone()
@@ -368,8 +1816,16 @@ class WarnetAdmin:
                 raise ValueError(f"User '{username}' does not exist")
                 
             # Delete user
-            self.cur.execute('DELETE FROM users WHERE username = ?', (username,))
-            self.conn.commit()
+            try:
+                self.cur.execute('DELETE FROM users WHERE username = ?', (username,))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def delete_user(self, username):
+        try:
+            self.remove_user(username)
             return True
             
         except ValueError as ve:
@@ -377,11 +1833,184 @@ class WarnetAdmin:
             return False
         except Exception as e:
             messagebox.showerror("Error", f"Failed to delete user: {str(e)}")
-            self.conn.rollback()
             return False
 
+    def list_clients(self):
+        """Snapshot of connected clients, safe to serialize"""
+        clients = []
+        for address, client in list(self.clients.items()):
+            clients.append({
+                'address': f"{address[0]}:{address[1]}",
+                'reported_ip': client['reported_ip'],
+                'hostname': client['hostname'],
+                'seat_id': client.get('seat_id'),
+                'username': client['username'],
+                'pc_type': client['pc_type'],
+                'connected_time': client['connected_time'].isoformat(timespec='seconds'),
+                'session_start': (client['session_start'].isoformat(timespec='seconds')
+                                  if client['session_start'] else None),
+                'ends_at': client.get('ends_at')
+            })
+        return clients
+
+
+class AdminRequestHandler(BaseHTTPRequestHandler):
+    """HTTP/JSON front end for WarnetAdmin; one thread per request.
+
+    Listings stream as NDJSON in pages ordered by username; the last line
+    carries next_cursor when more rows remain.
+    """
+    protocol_version = 'HTTP/1.1'
+    STREAM_BATCH = 500  # NDJSON lines per chunk written to the socket
+    MAX_PAGE = 100000
+
+    @property
+    def admin(self):
+        return self.server.admin
+
+    def log_message(self, format, *args):
+        print(f"API {self.address_string()} - {format % args}")
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream_ndjson(self, rows):
+        """Write an iterable of dicts as chunked NDJSON, batching small lines"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        batch = []
+        try:
+            for row in rows:
+                batch.append(json.dumps(row))
+                if len(batch) >= self.STREAM_BATCH:
+                    self.write_chunk(batch)
+                    batch = []
+        except OSError:
+            # Client went away; nothing more can be written
+            self.close_connection = True
+            return
+        except Exception as e:
+            # Headers are already out, so report the failure as the last line
+            print(f"Admin API stream error: {e}")
+            batch.append(json.dumps({'status': 'error', 'message': str(e)}))
+        try:
+            if batch:
+                self.write_chunk(batch)
+            self.wfile.write(b'0\r\n\r\n')
+        except OSError:
+            self.close_connection = True
+
+    def write_chunk(self, lines):
+        data = ('\n'.join(lines) + '\n').encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length))
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def authorized(self):
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get('Authorization', '').encode(),
+                                             f"Bearer {token}".encode()):
+            self.send_json(401, {'status': 'error', 'message': 'Invalid or missing token'})
+            return False
+        return True
+
+    def route(self, method):
+        if not self.authorized():
+            return
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if method == 'GET' and parts == ['users']:
+                return self.list_users(query)
+            if method == 'GET' and parts == ['clients']:
+                return self.stream_ndjson(self.admin.list_clients())
+            if method == 'GET' and parts == ['occupancy']:
+                return self.send_json(200, self.admin.occupancy_snapshot())
+            if method == 'POST' and parts == ['users']:
+                body = self.read_json()
+                if not body.get('username') or not body.get('password'):
+                    raise ValueError("Username and password required")
+                if not self.admin.add_user(body['username'], body['password']):
+                    return self.send_json(409, {'status': 'error', 'message': 'Username already exists'})
+                return self.send_json(201, {'status': 'success'})
+            if method == 'POST' and len(parts) == 3 and parts[0] == 'users' and parts[2] == 'balance':
+                body = self.read_json()
+                if body.get('package'):
+                    price = self.admin.add_package(parts[1], body['package'])
+                else:
+                    hours, pc_type = body.get('hours'), body.get('pc_type', 'Normal')
+                    self.admin.credit_balance(parts[1], hours, pc_type)
+                    price = self.admin.calculate_price(hours, pc_type)
+                return self.send_json(200, {'status': 'success', 'price': price})
+            if method == 'DELETE' and len(parts) == 2 and parts[0] == 'users':
+                self.admin.remove_user(parts[1])
+                return self.send_json(200, {'status': 'success'})
+            self.send_json(404, {'status': 'error', 'message': 'Not found'})
+        except ValueError as ve:
+            self.send_json(400, {'status': 'error', 'message': str(ve)})
+        except Exception as e:
+            print(f"Admin API error: {e}")
+            self.send_json(500, {'status': 'error', 'message': str(e)})
+
+    def list_users(self, query):
+        limit = int(query.get('limit', 1000))
+        if not 0 < limit <= self.MAX_PAGE:
+            raise ValueError(f"limit must be between 1 and {self.MAX_PAGE}")
+        cursor = query.get('cursor', '')
+
+        def rows():
+            # Own connection: WAL lets this read run alongside billing writes
+            conn = sqlite3.connect(self.admin.db_path)
+            try:
+                sent = 0
+                last = None
+                # One extra row tells whether another page follows
+                for username, balance, pc_type in conn.execute('''
+                    SELECT username, balance, pc_type FROM users
+                    WHERE username > ? ORDER BY username LIMIT ?
+                ''', (cursor, limit + 1)):
+                    if sent == limit:
+                        yield {'next_cursor': last}
+                        break
+                    sent += 1
+                    last = username
+                    yield {'username': username, 'balance': balance, 'pc_type': pc_type}
+            finally:
+                conn.close()
+
+        self.stream_ndjson(rows())
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_DELETE(self):
+        self.route('DELETE')
+
+
 class WarnetAdminGUI:
-    def __init__(self):
+    NO_PACKAGE = '(none)'
+    FRAME_INTERVAL_MS = 250  # Live view redraw period, fed by the server's event bus
+
+    def __init__(self, db_path='warnet.db', branch='', checkpoint_interval=None, api_port=None,
+                 api_host='127.0.0.1', api_token=None, record_path=None, workers=None):
         self.root = tk.Tk()
         self.root.title("Warnet Admin Server")
         
@@ -403,7 +2032,14 @@ class WarnetAdminGUI:
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
         
-        self.server = WarnetAdmin(gui_callback=self.update_clients_gui)
+        self.server = WarnetAdmin(db_path=db_path,
+                                  branch=branch, checkpoint_interval=checkpoint_interval,
+                                  api_port=api_port, api_host=api_host, api_token=api_token,
+                                  record_path=record_path, workers=workers)
+        # Subscribe before the server starts so no event is missed
+        self.events = self.server.bus.subscribe()
+        self.session_ends = {}  # clients_tree item -> ends_at of its session
+        self.time_left_shown = {}
         self.setup_gui()
         
         # Start server in background
@@ -411,10 +2047,6 @@ class WarnetAdminGUI:
         self.server_thread.daemon = True
         self.server_thread.start()
 
-    def update_clients_gui(self):
-        """Safe method to update GUI from any thread"""
-        self.root.after(0, self.refresh_clients)
-
     def setup_gui(self):
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
@@ -434,6 +2066,11 @@ class WarnetAdminGUI:
         self.notebook.add(self.clients_frame, text="Connected Clients")
         self.setup_clients_tab()
 
+        # Reservations tab
+        self.reservations_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.reservations_frame, text="Reservations")
+        self.setup_reservations_tab()
+
         # Server status (at the bottom, spanning full width)
         self.status_frame = ttk.Frame(self.root)
         self.status_frame.grid(row=1, column=0, sticky='ew', padx=5, pady=5)
@@ -477,29 +2114,42 @@ class WarnetAdminGUI:
 
         ttk.Label(balance_frame, text="PC Type:").grid(row=2, column=0, padx=5, pady=5)
         self.pc_type = ttk.Combobox(balance_frame, 
-                                values=list(self.server.PC_CATEGORIES.keys()),
+                                values=list(self.server.pricing.keys()),
                                 state='readonly')
         self.pc_type.set('Normal')
         self.pc_type.grid(row=2, column=1, sticky='ew', padx=5)
 
+        ttk.Label(balance_frame, text="Package:").grid(row=3, column=0, padx=5, pady=5)
+        self.package = ttk.Combobox(balance_frame, state='readonly',
+                                    postcommand=lambda: self.package.config(
+                                        values=[self.NO_PACKAGE] + list(self.server.packages.keys())))
+        self.package.set(self.NO_PACKAGE)
+        self.package.grid(row=3, column=1, sticky='ew', padx=5)
+
         # Add price display
         self.price_label = ttk.Label(balance_frame, text="Price: Rp 0")
-        self.price_label.grid(row=3, column=0, columnspan=2, pady=5)
+        self.price_label.grid(row=4, column=0, columnspan=2, pady=5)
 
         def update_price(*args):
+            package = self.server.packages.get(self.package.get())
+            if package:
+                self.price_label.config(text=f"Price: Rp {package['price']:,.0f} "
+                                             f"({package['hours']} hours {package['pc_type']})")
+                return
             try:
                 hours = float(self.balance_amount.get() or 0)
                 pc_type = self.pc_type.get()
-                price = hours * self.server.PC_CATEGORIES[pc_type]['rate']
+                price = self.server.calculate_price(hours, pc_type)
                 self.price_label.config(text=f"Price: Rp {price:,.0f}")
             except ValueError:
                 self.price_label.config(text="Price: Invalid input")
 
         self.balance_amount.bind('<KeyRelease>', update_price)
         self.pc_type.bind('<<ComboboxSelected>>', update_price)
+        self.package.bind('<<ComboboxSelected>>', update_price)
 
         ttk.Button(balance_frame, text="Add Balance", 
-                command=self.add_balance).grid(row=4, column=0, columnspan=2, pady=10)
+                command=self.add_balance).grid(row=5, column=0, columnspan=2, pady=10)
 
         # Users List
         list_frame = ttk.LabelFrame(self.users_frame, text="User List")
@@ -545,7 +2195,7 @@ class WarnetAdminGUI:
         self.clients_frame.grid_columnconfigure(0, weight=1)
         self.clients_frame.grid_rowconfigure(0, weight=1)
 
-        columns = ('IP', 'Username', 'Connected Since')
+        columns = ('IP', 'Hostname', 'User', 'Connected Since', 'Time Left')
         self.clients_tree = ttk.Treeview(self.clients_frame, columns=columns, show='headings')
         for col in columns:
             self.clients_tree.heading(col, text=col)
@@ -559,6 +2209,158 @@ class WarnetAdminGUI:
 
         ttk.Button(self.clients_frame, text="Refresh", command=self.refresh_clients).grid(row=1, column=0, columnspan=2, pady=5)
 
+        # Live seat occupancy per PC type
+        self.occupancy_label = ttk.Label(self.clients_frame, text="", anchor='w')
+        self.occupancy_label.grid(row=2, column=0, columnspan=2, sticky='ew', padx=5, pady=5)
+        self.refresh_occupancy()
+
+    def refresh_occupancy(self):
+        parts = []
+        for pc_type, counts in sorted(self.server.occupancy_snapshot().items()):
+            total = sum(counts.values())
+            if not total:
+                continue
+            parts.append(f"{pc_type}: {counts['free']} free / {counts['busy']} busy / {total} seats")
+        self.occupancy_label.config(text="   |   ".join(parts) or "No seats registered yet")
+
+    def setup_reservations_tab(self):
+        self.reservations_frame.grid_columnconfigure(0, weight=1)
+        self.reservations_frame.grid_rowconfigure(1, weight=1)
+
+        book_frame = ttk.LabelFrame(self.reservations_frame, text="New Reservation")
+        book_frame.grid(row=0, column=0, sticky='ew', padx=5, pady=5)
+        book_frame.grid_columnconfigure(1, weight=1)
+
+        ttk.Label(book_frame, text="Username:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        self.reservation_username = ttk.Entry(book_frame)
+        self.reservation_username.grid(row=0, column=1, sticky='ew', padx=5)
+
+        ttk.Label(book_frame, text="Seat (blank = any free):").grid(row=1, column=0, padx=5, pady=5, sticky='w')
+        self.reservation_seat = ttk.Combobox(book_frame, state='readonly',
+                                             postcommand=self.refresh_seat_choices)
+        self.reservation_seat.grid(row=1, column=1, sticky='ew', padx=5)
+
+        ttk.Label(book_frame, text="Start (YYYY-MM-DD HH:MM):").grid(row=2, column=0, padx=5, pady=5, sticky='w')
+        self.reservation_start = ttk.Entry(book_frame)
+        self.reservation_start.insert(0, datetime.now().strftime('%Y-%m-%d %H:00'))
+        self.reservation_start.grid(row=2, column=1, sticky='ew', padx=5)
+
+        ttk.Label(book_frame, text="Hours:").grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        self.reservation_hours = ttk.Entry(book_frame)
+        self.reservation_hours.grid(row=3, column=1, sticky='ew', padx=5)
+
+        buttons_frame = ttk.Frame(book_frame)
+        buttons_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        ttk.Button(buttons_frame, text="Reserve",
+                   command=self.add_reservation).pack(side='left', padx=5)
+        ttk.Button(buttons_frame, text="Next Free Slot",
+                   command=self.show_next_free_slot).pack(side='left', padx=5)
+
+        list_frame = ttk.LabelFrame(self.reservations_frame, text="Upcoming Reservations")
+        list_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
+        list_frame.grid_columnconfigure(0, weight=1)
+        list_frame.grid_rowconfigure(0, weight=1)
+
+        columns = ('ID', 'Seat', 'Username', 'Start', 'End')
+        self.reservations_tree = ttk.Treeview(list_frame, columns=columns, show='headings')
+        for col in columns:
+            self.reservations_tree.heading(col, text=col)
+            self.reservations_tree.column(col, width=100, anchor='center')
+        self.reservations_tree.grid(row=0, column=0, sticky='nsew')
+
+        y_scroll = ttk.Scrollbar(list_frame, orient='vertical', command=self.reservations_tree.yview)
+        y_scroll.grid(row=0, column=1, sticky='ns')
+        self.reservations_tree.configure(yscroll=y_scroll.set)
+
+        buttons_frame = ttk.Frame(list_frame)
+        buttons_frame.grid(row=1, column=0, columnspan=2, pady=5)
+        ttk.Button(buttons_frame, text="Refresh",
+                   command=self.refresh_reservations).pack(side='left', padx=5)
+        ttk.Button(buttons_frame, text="Cancel Reservation",
+                   command=self.cancel_selected_reservation).pack(side='left', padx=5)
+
+        self.refresh_reservations()
+
+    def seat_name(self, seat_id):
+        seat = self.server.seats.get(seat_id)
+        if not seat:
+            return str(seat_id)
+        return f"{seat_id}: {seat['hostname']} ({seat['reported_ip']}) {seat['pc_type']}"
+
+    def refresh_seat_choices(self):
+        self.reservation_seat.config(values=[self.seat_name(seat_id)
+                                             for seat_id in sorted(self.server.seats)])
+
+    def read_reservation_form(self, seat_required=True):
+        """Returns (seat_id, start, end) or raises ValueError; seat_id is None if not chosen"""
+        seat_id = None
+        if self.reservation_seat.get():
+            seat_id = int(self.reservation_seat.get().split(':')[0])
+        elif seat_required:
+            raise ValueError("Please select a seat")
+        try:
+            start = datetime.strptime(self.reservation_start.get().strip(), '%Y-%m-%d %H:%M')
+        except ValueError:
+            raise ValueError("Start must look like 2024-12-31 19:00")
+        try:
+            hours = float(self.reservation_hours.get())
+        except ValueError:
+            raise ValueError("Please enter valid number of hours")
+        if hours <= 0:
+            raise ValueError("Hours must be greater than 0")
+        return seat_id, start, start + timedelta(hours=hours)
+
+    def add_reservation(self):
+        try:
+            seat_id, start, end = self.read_reservation_form(seat_required=False)
+            # Without a chosen seat the server picks a free one of the user's type
+            reservation_id = self.server.add_reservation(self.reservation_username.get(), seat_id, start, end)
+            seat_id = self.server.reservation_info[reservation_id][0]
+        except ValueError as ve:
+            messagebox.showerror("Error", str(ve))
+            return
+        messagebox.showinfo("Success", f"Reserved {self.seat_name(seat_id)}\n"
+                                       f"{start:%Y-%m-%d %H:%M} - {end:%H:%M}")
+        self.refresh_reservations()
+
+    def show_next_free_slot(self):
+        try:
+            seat_id, start, end = self.read_reservation_form()
+        except ValueError as ve:
+            messagebox.showerror("Error", str(ve))
+            return
+        slot = self.server.next_free_slot(seat_id, start, end - start)
+        if slot != start:
+            self.reservation_start.delete(0, tk.END)
+            self.reservation_start.insert(0, slot.strftime('%Y-%m-%d %H:%M'))
+        messagebox.showinfo("Next Free Slot", f"{self.seat_name(seat_id)} is free from "
+                                              f"{slot:%Y-%m-%d %H:%M}")
+
+    def refresh_reservations(self):
+        for item in self.reservations_tree.get_children():
+            self.reservations_tree.delete(item)
+        for reservation_id, seat_id, username, start, end in self.server.upcoming_reservations():
+            self.reservations_tree.insert('', tk.END, values=(
+                reservation_id,
+                self.seat_name(seat_id),
+                username,
+                start.strftime('%Y-%m-%d %H:%M'),
+                end.strftime('%Y-%m-%d %H:%M')
+            ))
+
+    def cancel_selected_reservation(self):
+        selection = self.reservations_tree.selection()
+        if not selection:
+            messagebox.showwarning("Warning", "Please select a reservation to cancel")
+            return
+        reservation_id = self.reservations_tree.item(selection[0])['values'][0]
+        if messagebox.askyesno("Confirm Cancel", f"Cancel reservation #{reservation_id}?"):
+            try:
+                self.server.cancel_reservation(reservation_id)
+            except ValueError as ve:
+                messagebox.showerror("Error", str(ve))
+            self.refresh_reservations()
+
     def add_user(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
@@ -575,6 +2377,8 @@ class WarnetAdminGUI:
             messagebox.showerror("Error", "Please fill all fields")
 
     def add_balance(self):
+        if self.package.get() != self.NO_PACKAGE:
+            return self.add_package_balance()
         try:
             username = self.balance_username.get()
             hours = float(self.balance_amount.get())
@@ -591,14 +2395,30 @@ class WarnetAdminGUI:
         except ValueError:
             messagebox.showerror("Error", "Please enter valid number of hours")
 
+    def add_package_balance(self):
+        username = self.balance_username.get()
+        package_name = self.package.get()
+        try:
+            price = self.server.add_package(username, package_name)
+        except ValueError as ve:
+            messagebox.showerror("Error", str(ve))
+            return
+        if price is not None:
+            package = self.server.packages[package_name]
+            messagebox.showinfo("Success",
+                              f"Added {package_name}: {package['hours']} hours ({package['pc_type']} PC)\n"
+                              f"Price: Rp {price:,.0f}")
+            self.balance_username.delete(0, tk.END)
+            self.package.set(self.NO_PACKAGE)
+            self.refresh_users()
+
     def refresh_users(self):
         for item in self.users_tree.get_children():
             self.users_tree.delete(item)
         
-        self.server.cur.execute('SELECT username, password, balance, pc_type FROM users')
-        for user in self.server.cur.fetchall():
+        for user in self.server.user_rows():
             hours = user[2] / 60  # Convert minutes to hours
-            self.users_tree.insert('', tk.END, values=(
+            self.users_tree.insert('', tk.END, iid=user[0], values=(
                 user[0],          # username
                 user[1],          # password
                 f"{hours:.1f} hours",  # balance
@@ -606,17 +2426,85 @@ class WarnetAdminGUI:
             ))
 
     def refresh_clients(self):
+        """Rebuild the clients list from a snapshot (live updates come from on_frame)"""
         for item in self.clients_tree.get_children():
             self.clients_tree.delete(item)
-        
-        # Use client info from server's clients dictionary
-        for address, client_info in self.server.clients.items():
-            values = (
-                client_info['reported_ip'],  # Use reported IP instead of socket IP
-                client_info['hostname'],
-                client_info['connected_time'].strftime('%Y-%m-%d %H:%M:%S')
-            )
-            self.clients_tree.insert('', tk.END, values=values)
+        self.session_ends.clear()
+        self.time_left_shown.clear()
+
+        for client in self.server.list_clients():
+            self.clients_tree.insert('', tk.END, iid=client['address'], values=(
+                client['reported_ip'],  # Use reported IP instead of socket IP
+                client['hostname'],
+                client['username'] or '',
+                client['connected_time'].replace('T', ' '),
+                ''
+            ))
+            if client['ends_at']:
+                self.session_ends[client['address']] = client['ends_at']
+
+    def on_frame(self):
+        """Apply the events published since the last frame, then redraw the countdowns"""
+        events, dropped = self.events.drain()
+        if dropped:
+            # Fell behind: resync from snapshots instead of replaying a partial stream
+            self.refresh_clients()
+            self.refresh_users()
+            self.refresh_occupancy()
+        else:
+            seats_changed = False
+            for event in events:
+                if event['kind'] == 'seat_changed':
+                    seats_changed = True
+                else:
+                    self.apply_event(event)
+            if seats_changed:
+                self.refresh_occupancy()
+
+        # Only rows whose displayed second changed are touched
+        now = time.time()
+        for item, ends_at in self.session_ends.items():
+            seconds = max(0, int(ends_at - now))
+            text = f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+            if self.time_left_shown.get(item) != text and self.clients_tree.exists(item):
+                self.clients_tree.set(item, 'Time Left', text)
+                self.time_left_shown[item] = text
+        self.root.after(self.FRAME_INTERVAL_MS, self.on_frame)
+
+    def apply_event(self, event):
+        kind = event['kind']
+        if kind == 'balance_changed':
+            if self.users_tree.exists(event['username']):
+                self.users_tree.set(event['username'], 'Balance', f"{event['balance'] / 60:.1f} hours")
+            for address, ends_at in event['sessions']:
+                self.session_ends[f"{address[0]}:{address[1]}"] = ends_at
+            return
+
+        item = f"{event['address'][0]}:{event['address'][1]}"
+        if kind == 'client_connected':
+            if not self.clients_tree.exists(item):
+                self.clients_tree.insert('', tk.END, iid=item, values=(
+                    event['reported_ip'],
+                    event['hostname'],
+                    '',
+                    event['connected_time'].strftime('%Y-%m-%d %H:%M:%S'),
+                    ''
+                ))
+        elif kind == 'client_left':
+            if self.clients_tree.exists(item):
+                self.clients_tree.delete(item)
+            self.session_ends.pop(item, None)
+            self.time_left_shown.pop(item, None)
+        elif kind == 'session_started':
+            if self.clients_tree.exists(item):
+                self.clients_tree.set(item, 'User', event['username'])
+            self.session_ends[item] = event['ends_at']
+        elif kind == 'session_settled':
+            if self.clients_tree.exists(item):
+                self.clients_tree.set(item, 'User', '')
+                self.clients_tree.set(item, 'Time Left', '')
+            self.session_ends.pop(item, None)
+            self.time_left_shown.pop(item, None)
 
     def delete_selected_user(self):
         # Get selected item
@@ -637,15 +2525,165 @@ class WarnetAdminGUI:
 
     def run(self):
         self.refresh_users()
+        self.refresh_clients()
+        self.root.after(self.FRAME_INTERVAL_MS, self.on_frame)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.root.mainloop()
 
     def on_closing(self):
         if messagebox.askokcancel("Quit", "Do you want to shutdown the server?"):
-            self.server.running = False
+            self.server.cleanup()  # Settles every active session before exiting
             self.root.destroy()
             sys.exit(0)
 
+def is_loopback(host):
+    """Whether host only accepts connections from this machine"""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+def run_worker(worker_id, options, control, events, quiet=False):
+    """Entry point of a supervisor's worker process"""
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    server = WarnetAdmin(**options)
+    try:
+        server.serve_worker(worker_id, control, events)
+    except KeyboardInterrupt:
+        pass  # serve_worker already drained the sessions in its finally block
+
+def stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt  # Same drain path as Ctrl+C
+
+def serve_command(args):
+    # Service managers stop the server with SIGTERM: settle sessions and finish the capture
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    server = WarnetAdmin(db_path=args.db, branch=args.branch,
+                         checkpoint_interval=args.checkpoint_interval, api_port=args.api_port,
+                         api_host=args.api_host, api_token=args.api_token, record_path=args.record,
+                         workers=args.workers)
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass  # start() already drained the sessions in its finally block
+
+def import_command(args):
+    server = WarnetAdmin(db_path=args.db)
+    started = time.perf_counter()
+    report = server.import_csv(args.csv_file, args.chunk_size)
+    elapsed = time.perf_counter() - started
+
+    print(f"Imported {report['rows']} rows in {elapsed:.2f}s "
+          f"({report['rows'] / max(elapsed, 1e-9):,.0f} rows/s)")
+    print(f"Users added: {report['users_added']}, top-ups: {report['topups']}, "
+          f"errors: {len(report['errors'])}")
+
+    if args.errors:
+        with open(args.errors, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['line', 'username', 'error'])
+            writer.writerows(report['errors'])
+        print(f"Error report written to {args.errors}")
+    else:
+        for line, username, message in report['errors'][:20]:
+            print(f"  line {line} ({username}): {message}")
+        if len(report['errors']) > 20:
+            print(f"  ... {len(report['errors']) - 20} more, use --errors to save them all")
+    server.conn.close()
+
+def parse_clock(value):
+    """'HH:MM' -> minute of the day"""
+    hours, minutes = value.split(':')
+    minute = int(hours) * 60 + int(minutes)
+    if not 0 <= minute <= 24 * 60:
+        raise argparse.ArgumentTypeError(f"Invalid time '{value}'")
+    return minute
+
+def pricing_command(args):
+    server = WarnetAdmin(db_path=args.db, branch=args.branch)
+    if args.action == 'rate':
+        server.set_rate(args.pc_type, args.rate, args.branch)
+    elif args.action == 'window':
+        server.add_tariff(args.pc_type, args.start, args.end, args.rate, args.days,
+                          args.branch, args.priority)
+    elif args.action == 'package':
+        server.set_package(args.name, args.pc_type, args.hours, args.price, args.branch)
+
+    # Running servers pick edits up within PRICING_POLL_INTERVAL seconds
+    print(f"\nPricing for branch '{server.branch or '(default)'}':")
+    for pc_type, table in server.pricing.items():
+        print(f"  {pc_type}: Rp {table.base_rate:,}/hour list price")
+    for tariff_id, pc_type, branch, days, start, end, rate, priority in server.conn.execute(
+            'SELECT * FROM tariffs WHERE branch = \'\' OR branch = ? ORDER BY id', (server.branch,)):
+        print(f"  window #{tariff_id}: {pc_type} days {days} "
+              f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d} "
+              f"Rp {rate:,}/hour{' (' + branch + ')' if branch else ''}")
+    for name, package in server.packages.items():
+        print(f"  package {name}: {package['hours']} hours {package['pc_type']} "
+              f"for Rp {package['price']:,}")
+    server.conn.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Warnet billing server")
+    parser.add_argument('--db', default='warnet.db', help="SQLite database path")
+    parser.add_argument('--branch', default='', help="Branch name for per-branch pricing")
+    parser.add_argument('--checkpoint-interval', type=int, default=WarnetAdmin.CHECKPOINT_INTERVAL,
+                        help="Seconds between incremental usage charges")
+    parser.add_argument('--api-port', type=int, help="Serve the HTTP/JSON admin API on this port")
+    parser.add_argument('--api-host', default='127.0.0.1',
+                        help="Admin API bind address (use 0.0.0.0 for cashier terminals)")
+    parser.add_argument('--api-token', help="Require 'Authorization: Bearer <token>' on the admin API")
+    parser.add_argument('--record', help="Capture anonymized protocol traffic to this new .ndjson.gz file")
+    parser.add_argument('--workers', type=int,
+                        help="Accept connections in N worker processes sharing the port (SO_REUSEPORT)")
+    commands = parser.add_subparsers(dest='command')
+
+    serve_parser = commands.add_parser('serve', help="Run the server without the admin window")
+    serve_parser.set_defaults(handler=serve_command)
+
+    import_parser = commands.add_parser('import', help="Bulk add users and top-ups from a CSV file "
+                                        "(columns: username, password, hours, pc_type)")
+    import_parser.add_argument('csv_file')
+    import_parser.add_argument('--errors', help="Write rejected rows to this CSV file")
+    import_parser.add_argument('--chunk-size', type=int, default=WarnetAdmin.IMPORT_CHUNK_SIZE)
+    import_parser.set_defaults(handler=import_command)
+
+    pricing_parser = commands.add_parser('pricing', help="Show or edit rates, happy hours and packages")
+    pricing_actions = pricing_parser.add_subparsers(dest='action')
+    pricing_actions.add_parser('show')
+    rate_parser = pricing_actions.add_parser('rate', help="Set the list price per hour")
+    rate_parser.add_argument('pc_type')
+    rate_parser.add_argument('rate', type=int)
+    window_parser = pricing_actions.add_parser('window', help="Add a time-of-day rate, e.g. happy hour")
+    window_parser.add_argument('pc_type')
+    window_parser.add_argument('start', type=parse_clock, help="HH:MM")
+    window_parser.add_argument('end', type=parse_clock, help="HH:MM, may wrap past midnight")
+    window_parser.add_argument('rate', type=int)
+    window_parser.add_argument('--days', default='0123456', help="Weekdays, Monday = 0")
+    window_parser.add_argument('--priority', type=int, default=0)
+    package_parser = pricing_actions.add_parser('package', help="Add or replace a package bundle")
+    package_parser.add_argument('name')
+    package_parser.add_argument('pc_type')
+    package_parser.add_argument('hours', type=float)
+    package_parser.add_argument('price', type=int)
+    pricing_parser.set_defaults(handler=pricing_command)
+
+    args = parser.parse_args(argv)
+    if args.api_port and not args.api_token and not is_loopback(args.api_host):
+        parser.error(f"--api-token is required when the admin API listens on {args.api_host}")
+    if args.record and os.path.exists(args.record):
+        parser.error(f"{args.record} already exists, captures are never appended to")
+    return args
+
 if __name__ == "__main__":
-    admin_gui = WarnetAdminGUI()
-    admin_gui.run()
\ No newline at end of file
+    args = parse_args()
+    if args.command:
+        args.handler(args)
+    else:
+        admin_gui = WarnetAdminGUI(db_path=args.db, branch=args.branch,
+                                   checkpoint_interval=args.checkpoint_interval,
+                                   api_port=args.api_port, api_host=args.api_host,
+                                   api_token=args.api_token, record_path=args.record,
+                                   workers=args.workers)
+        admin_gui.run()
\ No newline at end of file
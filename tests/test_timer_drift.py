@@ -0,0 +1,112 @@
+"""The client countdown must track the billed balance when Tk callbacks fire late.
+
+The countdown runs on a fake clock with a scheduler whose after()
+callbacks are late by up to max_lag seconds, with an occasional stall.
+Each sync is answered after network_delay by a server reporting the true
+remaining time, truncated to server_step seconds.
+"""
+import heapq
+import itertools
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import WarnetClient
+
+
+def run_countdown(hours=2.0, max_lag=0.4, stall=3.0, stall_chance=0.01, network_delay=0.05,
+                  server_step=1, seed=1):
+    """Drive one session to its end; returns a report of redraws, syncs and the end time.
+
+    'ok' requires every redraw to be within a second of the true remaining
+    time and the session to end no later than the lag of the callback that
+    noticed it.
+    """
+    rng = random.Random(seed)
+    pending = []  # (due, order, callback)
+    order = itertools.count()
+
+    class FakeClock:
+        now = 0.0
+
+        def __call__(self):
+            return self.now
+
+    class FakeWindow:
+        def after(self, ms, callback):
+            lag = stall if rng.random() < stall_chance else rng.uniform(0, max_lag)
+            heapq.heappush(pending, (clock.now + ms / 1000 + lag, next(order), callback))
+
+    class FakeLabel:
+        def config(self, text):
+            hh, mm, ss = (int(part) for part in text.split(':'))
+            shown = hh * 3600 + mm * 60 + ss
+            error = abs(shown - math.ceil(true_end - clock.now))
+            report['redraws'] += 1
+            report['max_redraw_error'] = max(report['max_redraw_error'], error)
+
+    clock = FakeClock()
+    true_end = hours * 3600
+    report = {'redraws': 0, 'max_redraw_error': 0, 'syncs': 0, 'corrections': 0, 'end_error': None}
+
+    # Only the countdown state, no Tk window or socket
+    client = WarnetClient.__new__(WarnetClient)
+    client.clock = clock
+    client.window = FakeWindow()
+    client.timer_label = FakeLabel()
+    client.running = True
+    client.remaining_time = hours
+
+    def submit(command, *args):
+        if command == 'sync':
+            report['syncs'] += 1
+            remaining = (true_end - clock.now - network_delay) // server_step * server_step
+            reply = {'status': 'success', 'remaining_seconds': max(0, int(remaining))}
+            heapq.heappush(pending, (clock.now + network_delay, next(order),
+                                     lambda: client.on_sync(True, (reply, clock.now))))
+
+    def session_expired():
+        client.running = False
+        report['end_error'] = clock.now - true_end
+
+    def on_sync(ok, result):
+        deadline = client.deadline
+        WarnetClient.on_sync(client, ok, result)
+        report['corrections'] += client.deadline != deadline
+
+    client.submit = submit
+    client.session_expired = session_expired
+    client.on_sync = on_sync
+    client.start_countdown()
+    while pending and client.running:
+        clock.now, _, callback = heapq.heappop(pending)
+        callback()
+
+    report['ok'] = (report['max_redraw_error'] <= 1 and report['end_error'] is not None
+                    and -1 <= report['end_error'] <= max(max_lag, stall) + 0.001)
+    return report
+
+
+def test_default_lag():
+    report = run_countdown()
+    assert report['ok'], report
+    assert report['syncs'] > 0
+
+
+def test_frequent_stalls():
+    report = run_countdown(stall=5.0, stall_chance=0.05)
+    assert report['ok'], report
+
+
+def test_heavy_lag_and_slow_network():
+    report = run_countdown(hours=0.5, max_lag=0.9, network_delay=0.5, seed=7)
+    assert report['ok'], report
+
+
+def test_minute_granular_sync_is_caught():
+    # A server that reports whole minutes drags the countdown off the balance
+    report = run_countdown(server_step=60)
+    assert not report['ok'], report